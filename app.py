@@ -1,222 +1,112 @@
+import hashlib
+import time
+from io import BytesIO
+
 import streamlit as st
 import pandas as pd
-from io import BytesIO
 
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.datavalidation import DataValidation
+import clasificaciones
+import paginado
+from cubo import DIMENSIONES, CuboIncidencias, area_por_rut
+import perf
+from excel_cache import file_sha256
+from export_jobs import ExportJobs
+from ingest import FORMATOS, load_detalle, load_tabla
+from pipeline import (
+    CLASIF_OPTS,
+    KPI_ROLLUPS,
+    AgregadosIncrementales,
+    actualizar_agregados,
+    construir_incidencias,
+    filtrar_area,
+    filtrar_rango,
+    find_col,
+    normalizar,
+    ruts_con_problema,
+)
 
 st.set_page_config(page_title="Incidencias / Ausentismo / Asistencia", layout="wide")
 st.title("App Incidencias / Ausentismo / Asistencia")
 
-# =========================
-# Config
-# =========================
-CABIFY = {
-    "m1": "1F123F",
-    "m2": "362065",
-    "m3": "4A2B8D",
-    "m4": "5B34AC",
-    "m5": "7145D6",
-    "m6": "8A6EE4",
-    "m7": "A697ED",
-    "m8": "C4BDF5",
-    "m9": "DFDAF8",
-    "m10": "F5F1FC",
-    "m11": "FAF8FE",
-    "pink": "E83C96",
-    "red": "E74A41",
-    "orange": "EA8C2E",
-    "yellow": "EFBD03",
-    "blue": "4583D4",
-    "green": "0C936B",  # tu input decía #OC936B (O letra). Debe ser 0 (cero)
-}
-
-CLASIF_OPTS = ["Seleccionar", "Injustificada", "Permiso", "No Procede - Cambio de Turno"]
-
-# =========================
-# Helpers
-# =========================
-def normalize_rut(x) -> str:
-    if pd.isna(x):
-        return ""
-    return str(x).strip().upper().replace(".", "").replace(" ", "")
-
-def try_parse_date_any(x):
-    if pd.isna(x):
-        return pd.NaT
-    return pd.to_datetime(x, errors="coerce", dayfirst=True)
-
-def excel_to_df(file, sheet_index=0):
-    return pd.read_excel(file, sheet_name=sheet_index, engine="openpyxl")
-
-def find_col(df: pd.DataFrame, candidates):
-    norm_map = {str(c).strip().lower(): c for c in df.columns}
-    for cand in candidates:
-        k = str(cand).strip().lower()
-        if k in norm_map:
-            return norm_map[k]
-    # match suave
-    for cand in candidates:
-        k = str(cand).strip().lower()
-        for kk, real in norm_map.items():
-            if kk == k:
-                return real
-    return None
-
-def get_num(df, candidates):
-    col = find_col(df, candidates if isinstance(candidates, list) else [candidates])
-    if not col:
-        return pd.Series([0.0] * len(df))
-    return pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-
-def safe_text_series(df, candidates, default=""):
-    col = find_col(df, candidates)
-    if not col:
-        return pd.Series([default] * len(df))
-    return df[col].astype(str).fillna(default)
-
-def maybe_filter_area(df, only_area_value):
-    if not only_area_value:
-        return df
-    area_col = find_col(df, ["Área", "Area", "AREA"])
-    if not area_col:
-        return df
-    return df[df[area_col].astype(str).str.upper().str.contains(str(only_area_value).upper(), na=False)].copy()
-
-def split_fullname(fullname: str):
-    """
-    Intenta separar: Nombre(s) + 1er Apellido + 2do Apellido
-    Regla simple: últimos 2 tokens = apellidos, resto = nombre(s)
-    """
-    if not fullname or pd.isna(fullname):
-        return "", "", ""
-    toks = str(fullname).strip().split()
-    if len(toks) == 1:
-        return toks[0], "", ""
-    if len(toks) == 2:
-        return toks[0], toks[1], ""
-    nombre = " ".join(toks[:-2])
-    ap1 = toks[-2]
-    ap2 = toks[-1]
-    return nombre, ap1, ap2
+# cada rerun registra sus etapas (panel "Rendimiento" + log JSON lines)
+perf.start_run("app")
 
 # =========================
-# Excel styling + dropdown
+# Cache por etapas
 # =========================
-def style_ws_cabify(ws):
-    header_fill = PatternFill("solid", fgColor=CABIFY["m4"])
-    header_font = Font(color="FFFFFF", bold=True)
-    border_side = Side(style="thin", color=CABIFY["m2"])
-    border = Border(left=border_side, right=border_side, top=border_side, bottom=border_side)
-    alt_fill = PatternFill("solid", fgColor=CABIFY["m10"])
-    base_fill = PatternFill("solid", fgColor=CABIFY["m11"])
-
-    # header
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    # body (alternado)
-    for r in range(2, ws.max_row + 1):
-        fill = alt_fill if (r % 2 == 0) else base_fill
-        for c in range(1, ws.max_column + 1):
-            cell = ws.cell(row=r, column=c)
-            cell.fill = fill
-            cell.border = border
-            cell.alignment = Alignment(vertical="center")
-
-    # autofilter
-    if ws.max_column >= 1 and ws.max_row >= 1:
-        ws.auto_filter.ref = ws.dimensions
-
-    # ancho columnas (simple)
-    for col in range(1, ws.max_column + 1):
-        ws.column_dimensions[ws.cell(row=1, column=col).column_letter].width = 18
-
-def set_date_format(ws, df_cols, col_name="Fecha"):
-    if col_name not in df_cols:
-        return
-    idx = list(df_cols).index(col_name) + 1
-    for r in range(2, ws.max_row + 1):
-        c = ws.cell(row=r, column=idx)
-        c.number_format = "dd-mm-yyyy"
-
-def write_df_to_sheet(wb, name, df: pd.DataFrame):
-    ws = wb.create_sheet(title=name[:31])
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws.append(r)
-    return ws
-
-def ensure_list_sheet(wb):
-    if "Listas" in wb.sheetnames:
-        return wb["Listas"]
-    ws = wb.create_sheet("Listas")
-    ws.append(["Clasificación Manual"])
-    for opt in CLASIF_OPTS:
-        ws.append([opt])
-    ws.column_dimensions["A"].width = 30
-    return ws
-
-def apply_dropdown(ws, df_cols, target_col_name="Clasificación Manual"):
-    if target_col_name not in df_cols:
-        return
-    col_idx = list(df_cols).index(target_col_name) + 1
-    col_letter = ws.cell(row=1, column=col_idx).column_letter
-
-    # Validación referenciando Listas!$A$2:$A$5 (sin header)
-    dv = DataValidation(type="list", formula1="=Listas!$A$2:$A$5", allow_blank=False)
-    dv.error = "Selecciona una opción válida"
-    dv.errorTitle = "Opción inválida"
-    dv.prompt = "Selecciona una opción"
-    dv.promptTitle = "Clasificación Manual"
-
-    dv.add(f"{col_letter}2:{col_letter}1048576")
-    ws.add_data_validation(dv)
-
-def to_excel_bytes(dfs: dict, dropdown_sheet_name="Incidencias"):
-    output = BytesIO()
-    wb = Workbook()
-    wb.remove(wb.active)
-
-    # sheet listas para dropdown
-    ws_list = ensure_list_sheet(wb)
-    ws_list.sheet_state = "hidden"  # oculto, pero existe para validación
-
-    for name, df in dfs.items():
-        ws = write_df_to_sheet(wb, name, df)
-
-        # Fecha formateada
-        if "Fecha" in df.columns:
-            set_date_format(ws, df.columns, "Fecha")
-
-        # Dropdown solo en hoja principal
-        if name == dropdown_sheet_name and "Clasificación Manual" in df.columns:
-            apply_dropdown(ws, df.columns, "Clasificación Manual")
-
-        style_ws_cabify(ws)
-
-    wb.save(output)
-    output.seek(0)
-    return output
+# Cada etapa se cachea con una clave = hash del contenido de sus entradas + parámetros.
+# La clave de una etapa se encadena a la siguiente, así un rerun solo recalcula
+# las etapas que quedan aguas abajo de lo que realmente cambió.
+# Los DataFrames van con "_" (Streamlit no los hashea); la clave ya los representa.
+def content_hash(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        if isinstance(p, (bytes, bytearray)):
+            h.update(p)
+        elif isinstance(p, pd.DataFrame):
+            h.update(str(list(p.columns)).encode())
+            h.update(pd.util.hash_pandas_object(p, index=True).values.tobytes())
+        else:
+            h.update(repr(p).encode())
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def stage_ingest_tabla(files_key: str, _files):
+    # xlsx: cache en disco (parquet) compartido entre sesiones; devuelve (df, hits)
+    return load_tabla(_files)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def stage_ingest_detalle(files_key: str, _files):
+    # Detalle: hojas / archivos en paralelo, solo columnas del esquema (schema.py)
+    return load_detalle(_files)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def stage_normalizar(key: str, _df_activos, _df_inasist, _df_asist, rut_col_inas, rut_col_as):
+    return normalizar(_df_activos, _df_inasist, _df_asist, rut_col_inas, rut_col_as)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def stage_area(key: str, only_area_value, _df_activos, _grilla, _df_inasist, _df_asist):
+    return filtrar_area(_df_activos, _grilla, _df_inasist, _df_asist, only_area_value)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def stage_rango(key: str, desde, hasta, _df_activos, _grilla, _df_inasist, _df_asist):
+    return filtrar_rango(_df_activos, _grilla, _df_inasist, _df_asist, desde, hasta)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def stage_incidencias(key: str, min_inc_h, _df_inasist, _df_asist, rut_col_inas, rut_col_as):
+    return construir_incidencias(_df_inasist, _df_asist, rut_col_inas, rut_col_as, min_inc_h)
+
+# Export Excel: un pool por proceso (compartido entre sesiones), resultados por clave
+@st.cache_resource
+def export_jobs():
+    return ExportJobs(max_entries=4)
 
 # =========================
 # UI Inputs
 # =========================
 with st.sidebar:
-    st.header("Cargar archivos (Excel)")
-    f_turnos = st.file_uploader("1) Codificación Turnos BUK", type=["xlsx"])
-    f_reporte_turnos = st.file_uploader("2) Reporte Turnos (Activos + Turnos)", type=["xlsx"])
-    f_detalle = st.file_uploader("3) Detalle Turnos Colaboradores (Hoja1=Inasistencias, Hoja2=Asistencias)", type=["xlsx"])
+    st.header("Cargar archivos (Excel, CSV o Parquet)")
+    st.caption("Cada entrada acepta varios archivos (p. ej. varios periodos); se juntan y un archivo subido dos veces cuenta una vez.")
+    f_turnos = st.file_uploader("1) Codificación Turnos BUK", type=FORMATOS, accept_multiple_files=True)
+    f_reporte_turnos = st.file_uploader("2) Reporte Turnos (Activos + Turnos)", type=FORMATOS, accept_multiple_files=True)
+    f_detalle = st.file_uploader(
+        "3) Detalle Turnos Colaboradores (xlsx: Hoja1=Inasistencias, Hoja2=Asistencias; csv/parquet: una tabla)",
+        type=FORMATOS, accept_multiple_files=True,
+    )
+    f_clasificado = st.file_uploader("4) Reporte ya clasificado (opcional, Excel descargado de esta app)", type=["xlsx"])
 
     st.divider()
     st.subheader("Filtros")
     only_area = st.text_input("Filtrar Área (opcional)", value="AEROPUERTO")
     min_inc_h = st.number_input("Tiempo mínimo incidencia (horas)", min_value=0.0, value=0.0, step=0.25)
     st.caption("Se considera incidencia si Retraso ≥ umbral o Salida Anticipada ≥ umbral o (Retraso+Salida) ≥ umbral.")
+    kpi_rollups = st.multiselect(
+        "Totales en matriz KPI (opcional)",
+        options=list(KPI_ROLLUPS),
+        format_func=KPI_ROLLUPS.get,
+        default=[],
+    )
 
 if not all([f_turnos, f_reporte_turnos, f_detalle]):
     st.info("Sube los 3 archivos para comenzar.")
@@ -225,11 +115,32 @@ if not all([f_turnos, f_reporte_turnos, f_detalle]):
 # =========================
 # Load
 # =========================
-df_turnos = excel_to_df(f_turnos, 0)  # por ahora no se usa, queda listo para reglas futuras
-df_activos = excel_to_df(f_reporte_turnos, 0)
+def uploaded(files):
+    # [(nombre, bytes)] + clave = hashes de los archivos (el orden no importa)
+    out = [(f.name, f.getvalue()) for f in files]
+    return out, content_hash(*sorted(file_sha256(data) for _, data in out))
+
+files_turnos, key_turnos = uploaded(f_turnos)
+files_reporte, key_reporte = uploaded(f_reporte_turnos)
+files_detalle, key_detalle = uploaded(f_detalle)
+
+try:
+    df_turnos, hits_turnos = stage_ingest_tabla(key_turnos, files_turnos)  # por ahora no se usa, queda listo para reglas futuras
+    df_activos, hits_activos = stage_ingest_tabla(key_reporte, files_reporte)
+    df_inasist, df_asist, hits_detalle = stage_ingest_detalle(key_detalle, files_detalle)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
 
-df_inasist = excel_to_df(f_detalle, 0)  # Hoja 1
-df_asist = excel_to_df(f_detalle, 1)    # Hoja 2
+with st.sidebar:
+    st.divider()
+    st.subheader("Cache de archivos")
+    for label, hits in [
+        ("Codificación Turnos BUK", hits_turnos),
+        ("Reporte Turnos", hits_activos),
+        ("Detalle Turnos Colaboradores", hits_detalle),
+    ]:
+        st.caption(f"{'✅' if all(hits) else '⏳'} {sum(hits)}/{len(hits)} hit · {label}")
 
 # Detectar RUT en detalle
 rut_col_inas = find_col(df_inasist, ["RUT", "Rut", "rut"])
@@ -238,311 +149,282 @@ if not rut_col_inas or not rut_col_as:
     st.error("No pude detectar la columna RUT en una de las hojas del Detalle Turnos Colaboradores.")
     st.stop()
 
-df_inasist["RUT_norm"] = df_inasist[rut_col_inas].apply(normalize_rut)
-df_asist["RUT_norm"] = df_asist[rut_col_as].apply(normalize_rut)
-
-# Fecha base
-dia_col_inas = find_col(df_inasist, ["Día", "Dia", "DIA", "día"])
-df_inasist["Fecha_base"] = df_inasist[dia_col_inas].apply(try_parse_date_any) if dia_col_inas else pd.NaT
+# Normalización (RUT, fechas base, grilla de turnos planificados)
+key_norm = content_hash("normalizar", key_reporte, key_detalle)
+df_activos, grilla, df_inasist, df_asist = stage_normalizar(
+    key_norm, df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as
+)
 
-fecha_ent_col_as = find_col(df_asist, ["Fecha Entrada", "Fecha_Entrada", "Fecha entrada"])
-dia_col_as = find_col(df_asist, ["Día", "Dia", "DIA", "día"])
-if fecha_ent_col_as:
-    df_asist["Fecha_base"] = df_asist[fecha_ent_col_as].apply(try_parse_date_any)
-elif dia_col_as:
-    df_asist["Fecha_base"] = df_asist[dia_col_as].apply(try_parse_date_any)
-else:
-    df_asist["Fecha_base"] = pd.NaT
+# Cubo de drill-down (todo el aeropuerto, todo el periodo): una vez por ingesta y umbral,
+# con las clasificaciones guardadas; las ediciones entran después como deltas
+key_cubo = content_hash("cubo", key_norm, float(min_inc_h))
+if st.session_state.get("cubo_key") != key_cubo:
+    with perf.stage("cubo", rows_in=len(df_inasist) + len(df_asist)):
+        inc_todas = construir_incidencias(df_inasist, df_asist, rut_col_inas, rut_col_as, min_inc_h)
+        st.session_state["cubo"] = CuboIncidencias(
+            clasificaciones.aplicar(inc_todas),
+            area_por_rut(df_activos, find_col(df_activos, ["Área", "Area", "AREA"])),
+        )
+    st.session_state["cubo_key"] = key_cubo
+cubo = st.session_state["cubo"]
 
 # Filtrar por área (opcional)
-df_inasist = maybe_filter_area(df_inasist, only_area)
-df_asist = maybe_filter_area(df_asist, only_area)
-df_activos = maybe_filter_area(df_activos, only_area)
-
-# =========================
-# Turnos planificados (reporte turnos) -> formato largo
-# =========================
-# columnas fijas típicas
-fixed_cols_candidates = ["Nombre del Colaborador", "RUT", "Área", "Supervisor"]
-fixed_cols = [c for c in fixed_cols_candidates if c in df_activos.columns]
-date_cols = [c for c in df_activos.columns if c not in fixed_cols]
-
-# asegurar columna RUT
-if "RUT" not in df_activos.columns:
-    rut_col_act = find_col(df_activos, ["RUT", "Rut", "rut"])
-    if rut_col_act:
-        df_activos = df_activos.rename(columns={rut_col_act: "RUT"})
-        if "RUT" not in fixed_cols:
-            fixed_cols = [c for c in fixed_cols_candidates if c in df_activos.columns]
-        date_cols = [c for c in df_activos.columns if c not in fixed_cols]
-
-df_act_long = df_activos.melt(
-    id_vars=[c for c in fixed_cols if c in df_activos.columns],
-    value_vars=date_cols,
-    var_name="Fecha",
-    value_name="Turno_planificado"
+key_area = content_hash("area", key_norm, only_area)
+df_activos, grilla, df_inasist, df_asist, fechas_bounds = stage_area(
+    key_area, only_area, df_activos, grilla, df_inasist, df_asist
 )
 
-df_act_long["Fecha_dt"] = df_act_long["Fecha"].apply(try_parse_date_any)
-df_act_long["RUT_norm"] = df_act_long["RUT"].apply(normalize_rut) if "RUT" in df_act_long.columns else ""
-
-df_act_long["Turno_planificado"] = df_act_long["Turno_planificado"].astype(str).str.strip()
-df_act_long.loc[df_act_long["Turno_planificado"].isin(["", "nan", "NaT", "None", "-", "—"]), "Turno_planificado"] = ""
-
-# excluir libres (L) para planificación (tu regla)
-df_act_long["Turno_planificado_clean"] = df_act_long["Turno_planificado"].copy()
-df_act_long.loc[df_act_long["Turno_planificado_clean"].str.upper().isin(["L", "LIBRE"]), "Turno_planificado_clean"] = ""
+# RUTs vacíos / mal formados / con DV que no cuadra (del área)
+df_ruts = ruts_con_problema(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as)
 
 # =========================
 # Selector de fechas (se mantiene)
 # =========================
-min_date_candidates = []
-for s in [df_act_long["Fecha_dt"], df_inasist["Fecha_base"], df_asist["Fecha_base"]]:
-    s_ok = s.dropna()
-    if len(s_ok):
-        min_date_candidates.append(s_ok.min())
-        min_date_candidates.append(s_ok.max())
-
-if not min_date_candidates:
+if fechas_bounds is None:
     st.error("No pude detectar fechas válidas en los archivos.")
     st.stop()
 
-fecha_min = min(min_date_candidates)
-fecha_max = max(min_date_candidates)
+fecha_min, fecha_max = fechas_bounds
 
 fecha_desde, fecha_hasta = st.date_input(
     "📅 Selecciona rango de fechas:",
     value=(fecha_min.date(), fecha_max.date())
 )
 
-# filtrar por rango
-def filter_by_range(df, col):
-    if col not in df.columns:
-        return df
-    s = pd.to_datetime(df[col], errors="coerce")
-    return df[(s.dt.date >= fecha_desde) & (s.dt.date <= fecha_hasta)].copy()
-
-df_inasist = filter_by_range(df_inasist, "Fecha_base")
-df_asist = filter_by_range(df_asist, "Fecha_base")
-df_act_long = df_act_long[(df_act_long["Fecha_dt"].dt.date >= fecha_desde) & (df_act_long["Fecha_dt"].dt.date <= fecha_hasta)].copy()
-
-# =========================
-# (1) Filtrar colaboradores: SOLO los que existan en Detalle Turnos Colaboradores
-# =========================
-valid_ruts = set(pd.concat([df_inasist["RUT_norm"], df_asist["RUT_norm"]], ignore_index=True).dropna().unique().tolist())
-df_act_long = df_act_long[df_act_long["RUT_norm"].isin(valid_ruts)].copy()
-df_inasist = df_inasist[df_inasist["RUT_norm"].isin(valid_ruts)].copy()
-df_asist = df_asist[df_asist["RUT_norm"].isin(valid_ruts)].copy()
+# filtrar por rango + colaboradores presentes en Detalle Turnos Colaboradores
+key_rango = content_hash("rango", key_area, fecha_desde, fecha_hasta)
+df_inasist, df_asist, turnos_plan, tp_day, base_names = stage_rango(
+    key_rango, fecha_desde, fecha_hasta, df_activos, grilla, df_inasist, df_asist
+)
 
 # =========================
 # Incidencias: Asistencias (solo si supera umbral) + Inasistencias (para clasificar)
 # =========================
-inc_rows = []
-
-# Asistencias: retraso / salida anticipada (con umbral)
-retr = get_num(df_asist, ["Retraso (horas)", "Retraso horas", "Retraso"])
-sal = get_num(df_asist, ["Salida Anticipada (horas)", "Salida Anticipada", "Salida anticipada (horas)"])
-total_rs = retr + sal
-umbral = float(min_inc_h)
-
-mask_asist = (retr >= umbral) | (sal >= umbral) | (total_rs >= umbral)
-df_asist_inc = df_asist[mask_asist].copy()
-
-df_asist_inc["Fecha"] = df_asist_inc["Fecha_base"].dt.date
-df_asist_inc["Nombre"] = safe_text_series(df_asist_inc, ["Nombre"], "")
-df_asist_inc["Primer Apellido"] = safe_text_series(df_asist_inc, ["Primer Apellido", "Primer apellido"], "")
-df_asist_inc["Segundo Apellido"] = safe_text_series(df_asist_inc, ["Segundo Apellido", "Segundo apellido"], "")
-df_asist_inc["RUT"] = df_asist_inc[rut_col_as].astype(str)
-df_asist_inc["Turno"] = safe_text_series(df_asist_inc, ["Turno"], "")
-df_asist_inc["Especialidad"] = safe_text_series(df_asist_inc, ["Especialidad"], "")
-df_asist_inc["Supervisor"] = safe_text_series(df_asist_inc, ["Supervisor"], "")
-
-df_asist_inc["Tipo_Incidencia"] = "Marcaje/Turno"
-df_asist_inc["Detalle"] = (
-    "Retraso_h=" + retr[mask_asist].astype(str).values
-    + " | SalidaAnt_h=" + sal[mask_asist].astype(str).values
-    + " | Total_h=" + total_rs[mask_asist].astype(str).values
-)
-df_asist_inc["Clasificación Manual"] = "Seleccionar"
-
-inc_rows.append(df_asist_inc[[
-    "Fecha", "Nombre", "Primer Apellido", "Segundo Apellido", "RUT",
-    "Turno", "Especialidad", "Supervisor",
-    "Tipo_Incidencia", "Detalle", "Clasificación Manual"
-]])
-
-# Inasistencias: se listan completas (del rango) para clasificar
-df_inasist_inc = df_inasist.copy()
-df_inasist_inc["Fecha"] = df_inasist_inc["Fecha_base"].dt.date
-df_inasist_inc["Nombre"] = safe_text_series(df_inasist_inc, ["Nombre"], "")
-df_inasist_inc["Primer Apellido"] = safe_text_series(df_inasist_inc, ["Primer Apellido", "Primer apellido"], "")
-df_inasist_inc["Segundo Apellido"] = safe_text_series(df_inasist_inc, ["Segundo Apellido", "Segundo apellido"], "")
-df_inasist_inc["RUT"] = df_inasist_inc[rut_col_inas].astype(str)
-df_inasist_inc["Turno"] = safe_text_series(df_inasist_inc, ["Turno"], "")
-df_inasist_inc["Especialidad"] = safe_text_series(df_inasist_inc, ["Especialidad"], "")
-df_inasist_inc["Supervisor"] = safe_text_series(df_inasist_inc, ["Supervisor"], "")
-
-mot = safe_text_series(df_inasist_inc, ["Motivo"], "")
-df_inasist_inc["Tipo_Incidencia"] = "Inasistencia"
-df_inasist_inc["Detalle"] = "Motivo=" + mot
-df_inasist_inc["Clasificación Manual"] = "Seleccionar"
-
-inc_rows.append(df_inasist_inc[[
-    "Fecha", "Nombre", "Primer Apellido", "Segundo Apellido", "RUT",
-    "Turno", "Especialidad", "Supervisor",
-    "Tipo_Incidencia", "Detalle", "Clasificación Manual"
-]])
-
-df_incidencias = pd.concat(inc_rows, ignore_index=True)
-
-# Orden y fecha
-df_incidencias["Fecha"] = pd.to_datetime(df_incidencias["Fecha"], errors="coerce")
-df_incidencias = df_incidencias.sort_values(["Fecha", "RUT"], na_position="last").reset_index(drop=True)
+key_inc = content_hash("incidencias", key_rango, float(min_inc_h))
+df_incidencias = stage_incidencias(key_inc, min_inc_h, df_inasist, df_asist, rut_col_inas, rut_col_as)
+# tabla maestra de la sesión: clasificaciones guardadas (SQLite) aplicadas una vez por tabla
+# armada (al volver a un rango se leen frescas); el editor paginado escribe en ella
+if st.session_state.get("guardadas_key") != key_inc:
+    st.session_state["guardadas"] = clasificaciones.aplicar(df_incidencias)
+    st.session_state["claves"] = clasificaciones.claves(df_incidencias)  # fijas mientras no cambie la tabla
+    st.session_state["guardadas_key"] = key_inc
+
+# reporte clasificado offline: se cruza una vez por (archivo, tabla) y lo importado se guarda
+if f_clasificado is not None:
+    bytes_clasif = f_clasificado.getvalue()
+    key_import = content_hash("import", file_sha256(bytes_clasif), key_inc)
+    if st.session_state.get("import_key") != key_import:
+        try:
+            importadas = clasificaciones.leer_clasificadas(BytesIO(bytes_clasif))
+        except Exception as e:
+            # hoja / columnas faltantes o archivo que no es xlsx
+            st.session_state["import_reporte"] = str(e)
+        else:
+            df_imp, filas_imp, conflictos, sin_cruce, invalidas = clasificaciones.fusionar(
+                st.session_state["guardadas"], importadas, k=st.session_state["claves"]
+            )
+            clasificaciones.guardar(df_imp, filas_imp, k=st.session_state["claves"])
+            st.session_state["guardadas"] = df_imp
+            st.session_state["clasif_prev"] = df_imp["Clasificación Manual"].copy()
+            st.session_state.pop("cubo_key", None)  # se rearma con lo importado (ya guardado)
+            st.session_state["import_reporte"] = (len(importadas), len(filas_imp), conflictos, sin_cruce, invalidas)
+        st.session_state["import_key"] = key_import
+df_incidencias = st.session_state["guardadas"]
+key_maestra = content_hash("maestra", key_inc, st.session_state.get("import_key"))
 
 # =========================
 # UI principal
 # =========================
+if len(df_ruts):
+    with st.expander(f"⚠️ RUTs con problema ({len(df_ruts)})", expanded=False):
+        st.caption("Vacíos o con formato inválido no cruzan con el Reporte Turnos. "
+                   "Con DV que no coincide sí cruzan (por número), pero conviene corregirlos.")
+        st.dataframe(df_ruts, use_container_width=True, hide_index=True)
+
+if f_clasificado is not None and "import_reporte" in st.session_state:
+    reporte = st.session_state["import_reporte"]
+    if isinstance(reporte, str):
+        st.error(f"No pude leer el reporte clasificado: {reporte}")
+    else:
+        n_leidas, n_aplicadas, conflictos, sin_cruce, invalidas = reporte
+        st.success(f"Reporte clasificado: {n_leidas} filas leídas, {n_aplicadas} clasificaciones aplicadas.")
+        if len(conflictos):
+            with st.expander(f"⚠️ Conflictos ({len(conflictos)}): se usó la clasificación importada", expanded=False):
+                st.dataframe(conflictos, use_container_width=True, hide_index=True)
+        if len(sin_cruce):
+            with st.expander(f"⚠️ Filas sin cruce ({len(sin_cruce)})", expanded=False):
+                st.caption("No hay incidencia con ese RUT, fecha, tipo y detalle en el periodo/área actual.")
+                st.dataframe(sin_cruce, use_container_width=True, hide_index=True)
+        if len(invalidas):
+            with st.expander(f"⚠️ Clasificaciones no válidas ({len(invalidas)}): no se aplicaron", expanded=False):
+                st.caption(f"Valores aceptados: {', '.join(CLASIF_OPTS)}.")
+                st.dataframe(invalidas, use_container_width=True, hide_index=True)
+
 st.subheader("Reporte Total de Incidencias (para clasificar)")
 
-edited = st.data_editor(
+# Editor paginado: la maestra (df_incidencias) queda en el servidor; se filtra aquí y al
+# navegador va solo la página. Las ediciones vuelven a la maestra por índice de fila.
+with st.expander("Filtros de la tabla", expanded=False):
+    fc1, fc2, fc3, fc4 = st.columns(4)
+    filtro_rut = fc1.text_input("RUT contiene", value="", key="tabla_rut")
+    filtro_sup = fc2.multiselect("Supervisor", options=sorted(df_incidencias["Supervisor"].dropna().unique()), key="tabla_sup")
+    filtro_tipo = fc3.multiselect("Tipo", options=sorted(df_incidencias["Tipo_Incidencia"].dropna().unique()), key="tabla_tipo")
+    filtro_estado = fc4.selectbox("Clasificación", options=paginado.ESTADOS, key="tabla_estado")
+    filtro_dias = st.date_input("Fechas", value=(fecha_desde, fecha_hasta), key="tabla_fechas")
+
+dias_tabla = tuple(filtro_dias) if isinstance(filtro_dias, (tuple, list)) else (filtro_dias,)
+vista = paginado.filtrar(
     df_incidencias,
+    desde=dias_tabla[0] if dias_tabla else None,
+    hasta=dias_tabla[-1] if dias_tabla else None,
+    rut=filtro_rut, supervisores=filtro_sup, tipos=filtro_tipo, estado=filtro_estado,
+)
+
+pc1, pc2, pc3 = st.columns([1, 1, 4])
+tam_pagina = pc1.selectbox("Filas por página", options=[50, 100, 250, 500], index=1, key="tabla_tam")
+total_paginas = paginado.n_paginas(len(vista), tam_pagina)
+# la página vive solo en session_state (el widget no recibe value=)
+st.session_state.setdefault("tabla_pagina", 1)
+if st.session_state["tabla_pagina"] > total_paginas:
+    st.session_state["tabla_pagina"] = total_paginas  # los filtros achicaron la vista
+n_pagina = pc2.number_input("Página", min_value=1, max_value=total_paginas, step=1, key="tabla_pagina")
+pc3.caption(f"{len(vista)} de {len(df_incidencias)} incidencias · página {n_pagina} de {total_paginas}")
+
+# la página se fija al entrar (mismos filtros / página = misma entrada del editor entre reruns)
+sig_pagina = content_hash("pagina", key_maestra, filtro_rut, filtro_sup, filtro_tipo, filtro_estado,
+                          dias_tabla, tam_pagina, n_pagina)
+if st.session_state.get("pagina_sig") != sig_pagina:
+    st.session_state["pagina_sig"] = sig_pagina
+    st.session_state["pagina_base"] = paginado.pagina(vista, n_pagina, tam_pagina).copy()
+    st.session_state["pagina_n"] = st.session_state.get("pagina_n", 0) + 1
+
+pagina_editada = st.data_editor(
+    st.session_state["pagina_base"],
     use_container_width=True,
-    num_rows="dynamic",
+    disabled=[c for c in df_incidencias.columns if c != "Clasificación Manual"],
     column_config={
         "Clasificación Manual": st.column_config.SelectboxColumn(
             options=CLASIF_OPTS
         )
-    }
+    },
+    key=f"editor_{st.session_state['pagina_n']}",
 )
+paginado.merge_pagina(df_incidencias, pagina_editada)
+edited = df_incidencias
+
+# Persistir clasificaciones: solo las filas cuya Clasificación Manual cambió desde el rerun anterior
+if st.session_state.get("clasif_key") != key_inc:
+    st.session_state["clasif_prev"] = df_incidencias["Clasificación Manual"].copy()
+    st.session_state["clasif_key"] = key_inc
+clasif_prev = st.session_state["clasif_prev"].reindex(edited.index)
+clasif_now = edited["Clasificación Manual"]
+cambiadas = edited.index[((clasif_now != clasif_prev) & ~(clasif_now.isna() & clasif_prev.isna())).to_numpy()]
+if len(cambiadas):
+    clasificaciones.guardar(edited, cambiadas, k=st.session_state["claves"])
+    # cubo: la fila sale de su clasificación anterior (si existía) y entra en la nueva
+    antes = edited.loc[cambiadas].assign(**{"Clasificación Manual": clasif_prev.loc[cambiadas].to_numpy()})
+    cubo.aplicar(antes[antes["Clasificación Manual"].notna()], edited.loc[cambiadas])
+    st.session_state["clasif_prev"] = edited["Clasificación Manual"].copy()
+
+# Agregados incrementales: viven en la sesión y cada edición entra como delta de las filas
+# que cambiaron; se rearman desde cero solo si cambia alguna etapa anterior o los totales KPI
+kpi_rollups = tuple(kpi_rollups)
+key_agg_base = content_hash("agregados", key_inc, kpi_rollups)
+if st.session_state.get("agregados_key") != key_agg_base:
+    st.session_state["agregados"] = AgregadosIncrementales(
+        turnos_plan, tp_day, base_names, fecha_desde, fecha_hasta, kpi_rollups
+    )
+    st.session_state["agregados_key"] = key_agg_base
+resumen, cumpl, mat = actualizar_agregados(st.session_state["agregados"], edited)
+with perf.stage("hash tabla editada", rows_in=len(edited)):
+    key_agg = content_hash("agregados", key_agg_base, edited)
 
 # =========================
 # Resumen dinámico (se actualiza cuando editas)
 # =========================
 st.subheader("Resumen dinámico (según Clasificación Manual)")
-
-resumen = (
-    edited.groupby(["Clasificación Manual", "Tipo_Incidencia"], dropna=False)
-    .size()
-    .reset_index()
-    .rename(columns={0: "Cantidad"})
-    .sort_values("Cantidad", ascending=False)
-)
 st.dataframe(resumen, use_container_width=True)
 
 # =========================
 # Cumplimiento por colaborador (base = turnos planificados activos sin 'L')
 # =========================
 st.subheader("Cumplimiento por colaborador (base = turnos planificados del periodo, sin Libres)")
-
-df_turnos_valid = df_act_long[df_act_long["Turno_planificado_clean"] != ""].copy()
-
-# turnos planificados por rut (en el rango filtrado)
-turnos_plan = (
-    df_turnos_valid.groupby("RUT_norm")
-    .size()
-    .reset_index(name="Turnos_planificados")
-)
-
-# injustificadas por rut (desde la tabla editada)
-tmp = edited.copy()
-tmp["RUT_norm"] = tmp["RUT"].apply(normalize_rut)
-inj_cnt = (
-    tmp[tmp["Clasificación Manual"] == "Injustificada"]
-    .groupby("RUT_norm")
-    .size()
-    .reset_index(name="Injustificadas")
-)
-
-cumpl = turnos_plan.merge(inj_cnt, on="RUT_norm", how="left")
-cumpl["Injustificadas"] = cumpl["Injustificadas"].fillna(0).astype(int)
-
-# nombres: preferir reporte turnos (Nombre del Colaborador)
-name_col = find_col(df_activos, ["Nombre del Colaborador", "Nombre", "Colaborador"])
-if name_col:
-    base_names = df_activos.copy()
-    base_names["RUT_norm"] = base_names["RUT"].apply(normalize_rut)
-    base_names = base_names[base_names["RUT_norm"].isin(valid_ruts)].copy()
-
-    base_names = base_names.drop_duplicates("RUT_norm")[["RUT_norm", name_col]]
-    base_names[["Nombre", "Primer Apellido", "Segundo Apellido"]] = base_names[name_col].apply(
-        lambda x: pd.Series(split_fullname(x))
-    )
-else:
-    base_names = tmp.drop_duplicates("RUT_norm")[["RUT_norm", "Nombre", "Primer Apellido", "Segundo Apellido"]]
-
-cumpl = cumpl.merge(base_names[["RUT_norm", "Nombre", "Primer Apellido", "Segundo Apellido"]], on="RUT_norm", how="left")
-
-# cumplimiento %
-cumpl["Cumplimiento_%"] = (1 - (cumpl["Injustificadas"] / cumpl["Turnos_planificados"].replace({0: pd.NA}))) * 100
-cumpl["Cumplimiento_%"] = cumpl["Cumplimiento_%"].round(2)
-
-cumpl = cumpl[[
-    "Nombre", "Primer Apellido", "Segundo Apellido",
-    "RUT_norm", "Turnos_planificados", "Injustificadas", "Cumplimiento_%"
-]].rename(columns={"RUT_norm": "RUT_norm_sin_puntos"}).sort_values(["Cumplimiento_%", "Injustificadas"], ascending=[True, False])
-
 st.dataframe(cumpl, use_container_width=True)
 
 # =========================
 # KPIs diarios (matriz: KPIs filas, fechas columnas)
 # =========================
 st.subheader("KPIs diarios (matriz)")
+st.dataframe(mat, use_container_width=True)
 
-# Fechas del periodo (día a día)
-all_days = pd.date_range(pd.to_datetime(fecha_desde), pd.to_datetime(fecha_hasta), freq="D")
-day_labels = [d.strftime("%d-%m-%Y") for d in all_days]
-
-# Turnos planificados diarios (sin libres)
-tp_day = (
-    df_turnos_valid.groupby(df_turnos_valid["Fecha_dt"].dt.date)
-    .size()
+# =========================
+# Drill-down (cubo precalculado, todo el aeropuerto)
+# =========================
+st.subheader("Drill-down por Área / Supervisor / Especialidad (todo el aeropuerto)")
+dims_filtro = ["Área", "Supervisor", "Especialidad", "Tipo_Incidencia", "Clasificación Manual"]
+cols_filtro = st.columns(len(dims_filtro))
+filtros_cubo = {
+    dim: col.multiselect(dim, options=cubo.opciones(dim), default=[], key=f"cubo_{dim}")
+    for dim, col in zip(dims_filtro, cols_filtro)
+}
+por_cubo = st.multiselect(
+    "Agrupar por", options=[d for d in DIMENSIONES if d != "Clasificación Manual"], default=["Área"], key="cubo_por"
 )
-# Injustificadas diarias
-tmp2 = edited.copy()
-tmp2["Fecha_dt"] = pd.to_datetime(tmp2["Fecha"], errors="coerce").dt.date
-inj_day = (
-    tmp2[tmp2["Clasificación Manual"] == "Injustificada"]
-    .groupby("Fecha_dt")
-    .size()
+st.dataframe(
+    cubo.consultar(filtros_cubo, por_cubo, desde=fecha_desde, hasta=fecha_hasta),
+    use_container_width=True, hide_index=True,
 )
 
-# armar matriz
-kpi_rows = ["Turnos_planificados", "Injustificadas", "Cumplimiento_%"]
-mat = pd.DataFrame(index=kpi_rows, columns=day_labels)
-
-for d in all_days:
-    dd = d.date()
-    tp = int(tp_day.get(dd, 0))
-    ij = int(inj_day.get(dd, 0))
-    mat.loc["Turnos_planificados", d.strftime("%d-%m-%Y")] = tp
-    mat.loc["Injustificadas", d.strftime("%d-%m-%Y")] = ij
-    if tp > 0:
-        mat.loc["Cumplimiento_%", d.strftime("%d-%m-%Y")] = round((1 - (ij / tp)) * 100, 2)
-    else:
-        mat.loc["Cumplimiento_%", d.strftime("%d-%m-%Y")] = ""
-
-mat = mat.reset_index().rename(columns={"index": "KPI"})
-st.dataframe(mat, use_container_width=True)
-
 # =========================
 # Export Excel (Cabify + dropdown)
 # =========================
 st.subheader("Descarga")
 
-# Preparar Incidencias: Fecha como datetime para que Excel la reconozca
-edited_export = edited.copy()
-edited_export["Fecha"] = pd.to_datetime(edited_export["Fecha"], errors="coerce")
-
-excel_bytes = to_excel_bytes({
-    "Incidencias": edited_export,
-    "Resumen": resumen,
-    "Cumplimiento": cumpl,
-    "KPIs_Diarios": mat
-}, dropdown_sheet_name="Incidencias")
-
-st.download_button(
-    "Descargar Excel consolidado (Cabify + dropdown)",
-    data=excel_bytes,
-    file_name="reporte_incidencias_consolidado.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
+# El Excel se arma solo al pedirlo (en segundo plano); clave = hash de lo exportado
+jobs = export_jobs()
+job = jobs.get(key_agg)
+
+# si el último intento falló, el botón vuelve a aparecer (submit reemplaza el job con error)
+if (job is None or job.error is not None) and st.button("Generar Excel consolidado (Cabify + dropdown)"):
+    # Preparar Incidencias: Fecha como datetime para que Excel la reconozca
+    edited_export = edited.copy()
+    edited_export["Fecha"] = pd.to_datetime(edited_export["Fecha"], errors="coerce")
+
+    export_sheets = {
+        "Incidencias": edited_export,
+        "Resumen": resumen,
+        "Cumplimiento": cumpl,
+        "KPIs_Diarios": mat
+    }
+    if len(df_ruts):
+        export_sheets["RUTs_Invalidos"] = df_ruts
+    job = jobs.submit(key_agg, export_sheets, dropdown_sheet_name="Incidencias")
+
+if job is not None and not job.done:
+    bar = st.progress(0.0, text="Generando Excel…")
+    while not job.done:
+        bar.progress(job.progress, text=f"Generando Excel… {job.progress:.0%}")
+        time.sleep(0.2)
+    bar.empty()
+
+if job is not None and job.error is not None:
+    st.error(f"No se pudo generar el Excel: {job.error}")
+elif job is not None:
+    st.download_button(
+        "Descargar Excel consolidado (Cabify + dropdown)",
+        data=job.result(),
+        file_name="reporte_incidencias_consolidado.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
+else:
+    st.caption("El Excel se genera al pedirlo; si el reporte no cambia, la descarga queda lista.")
+
+# =========================
+# Rendimiento (etapas de este rerun)
+# =========================
+perf_run = perf.end_run()
+with st.sidebar:
+    with st.expander("Rendimiento", expanded=False):
+        st.caption("Etapas calculadas en este rerun (las que no aparecen se sirvieron desde cache).")
+        st.dataframe(perf_run.to_frame(), use_container_width=True, hide_index=True)
+        st.caption(f"Tiempo total: {perf_run.to_frame()['seconds'].sum():.2f} s · run {perf_run.run_id}")
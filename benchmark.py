@@ -0,0 +1,184 @@
+"""
+Benchmark por etapa del pipeline sobre datos sintéticos (ver synthetic_data.py).
+Guarda tiempos (y memoria pico con --memory) en JSON para comparar entre commits.
+
+    python benchmark.py --workers 1000 --days 31 --json bench.json
+    python benchmark.py --workers 1000 --days 31 --json bench_nuevo.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+import pipeline
+import utils
+from synthetic_data import generate
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _rows(obj):
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(_rows(v) for v in obj.values())
+    if isinstance(obj, (tuple, list)):
+        return sum(_rows(v) for v in obj)
+    if hasattr(obj, "getbuffer"):
+        return obj.getbuffer().nbytes
+    if isinstance(obj, bytes):
+        return len(obj)
+    return 0
+
+def measure(fn, repeat=1, memory=False):
+    """
+    Mejor tiempo de `repeat` corridas; si memory, una corrida extra con tracemalloc (MB pico).
+    """
+    best, result = None, None
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return best, peak_mb, result
+
+def run_benchmarks(data, repeat=1, memory=False, only=None):
+    results = {}
+    ctx = {}
+
+    def stage(name, fn, rows_in):
+        if only and name not in only:
+            # igual se calcula (las etapas siguientes lo necesitan), sin medir
+            return fn()
+        seconds, peak_mb, out = measure(fn, repeat=repeat, memory=memory)
+        results[name] = {
+            "seconds": round(seconds, 4),
+            "peak_mb": None if peak_mb is None else round(peak_mb, 1),
+            "rows_in": rows_in,
+            "rows_out": _rows(out),
+        }
+        print(f"{name:<36} {seconds:>9.3f}s" + ("" if peak_mb is None else f" {peak_mb:>9.1f} MB"))
+        return out
+
+    turnos, activos = data["turnos"], data["activos"]
+    inasist, asist = data["inasistencias"], data["asistencias"]
+
+    # ---- utils.py
+    ctx["catalog"] = stage("utils.build_shift_catalog", lambda: utils.build_shift_catalog(turnos), len(turnos))
+    ctx["act_long"] = stage("utils.prepare_activos_turnos",
+                            lambda: utils.prepare_activos_turnos(activos, ctx["catalog"]), len(activos))
+    ctx["asist"] = stage("utils.prepare_asistencias",
+                         lambda: utils.prepare_asistencias(asist, ctx["catalog"]), len(asist))
+    ctx["inc"] = stage("utils.detect_incidencias",
+                       lambda: utils.detect_incidencias(ctx["act_long"], ctx["asist"], None),
+                       len(ctx["act_long"]) + len(ctx["asist"]))
+    inc_edit = ctx["inc"].copy()
+    inc_edit["Comprobación Incidencia"] = inc_edit.index.map(lambda i: "Procede" if i % 2 else "Indefinido")
+    stage("utils.build_outputs",
+          lambda: utils.build_outputs(ctx["act_long"], ctx["asist"], inc_edit), len(inc_edit))
+
+    # ---- pipeline.py (app.py)
+    rut_inas, rut_as = pipeline.detect_rut_cols(inasist, asist)
+    ctx["norm"] = stage("pipeline.normalizar",
+                        lambda: pipeline.normalizar(activos, inasist, asist, rut_inas, rut_as),
+                        len(activos) + len(inasist) + len(asist))
+    ctx["area"] = stage("pipeline.filtrar_area",
+                        lambda: pipeline.filtrar_area(*ctx["norm"], "AEROPUERTO"), _rows(ctx["norm"]))
+    desde, hasta = ctx["area"][4][0].date(), ctx["area"][4][1].date()
+    ctx["rango"] = stage("pipeline.filtrar_rango",
+                         lambda: pipeline.filtrar_rango(*ctx["area"][:4], desde, hasta), _rows(ctx["area"][:4]))
+    df_inasist_r, df_asist_r, turnos_plan, tp_day, base_names = ctx["rango"]
+    ctx["incidencias"] = stage("pipeline.construir_incidencias",
+                               lambda: pipeline.construir_incidencias(df_inasist_r, df_asist_r, rut_inas, rut_as, 0.0),
+                               len(df_inasist_r) + len(df_asist_r))
+    edited = ctx["incidencias"].copy()
+    edited.loc[edited.index[::3], "Clasificación Manual"] = "Injustificada"
+    ctx["agg"] = stage("pipeline.construir_agregados",
+                       lambda: pipeline.construir_agregados(edited, turnos_plan, tp_day, base_names, desde, hasta,
+                                                            ("semana", "mes")),
+                       len(edited))
+
+    # ---- export Excel (ambas implementaciones)
+    resumen, cumpl, mat = ctx["agg"]
+    sheets = {"Incidencias": edited, "Resumen": resumen, "Cumplimiento": cumpl, "KPIs_Diarios": mat}
+    stage("pipeline.to_excel_bytes (openpyxl)",
+          lambda: pipeline.to_excel_bytes(sheets, dropdown_sheet_name="Incidencias"), _rows(sheets))
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        print("utils.to_excel_bytes: se omite (falta xlsxwriter)")
+    else:
+        stage("utils.to_excel_bytes (xlsxwriter)",
+              lambda: utils.to_excel_bytes(sheets, multi_sheet=True), _rows(sheets))
+
+    return results
+
+def compare(current: dict, previous: dict):
+    print(f"\n{'etapa':<36} {'antes':>9} {'ahora':>9} {'ratio':>7}")
+    for name, cur in current["stages"].items():
+        prev = previous.get("stages", {}).get(name)
+        if not prev:
+            print(f"{name:<36} {'-':>9} {cur['seconds']:>8.3f}s")
+            continue
+        ratio = cur["seconds"] / prev["seconds"] if prev["seconds"] else float("inf")
+        flag = "  <-- más lento" if ratio > 1.2 else ""
+        print(f"{name:<36} {prev['seconds']:>8.3f}s {cur['seconds']:>8.3f}s {ratio:>6.2f}x{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapa del pipeline de incidencias.")
+    parser.add_argument("--workers", type=int, default=500)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--punch-noise", type=float, default=0.1)
+    parser.add_argument("--overnight-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Corridas por etapa (se guarda la mejor)")
+    parser.add_argument("--memory", action="store_true", help="Mide memoria pico con tracemalloc (más lento)")
+    parser.add_argument("--only", nargs="*", default=None, help="Medir solo estas etapas")
+    parser.add_argument("--json", default=None, help="Archivo JSON de salida")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args(argv)
+
+    data = generate(args.workers, args.days, punch_noise=args.punch_noise,
+                    overnight_share=args.overnight_share, seed=args.seed)
+    stages = run_benchmarks(data, repeat=args.repeat, memory=args.memory, only=args.only)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "workers": args.workers,
+            "days": args.days,
+            "punch_noise": args.punch_noise,
+            "overnight_share": args.overnight_share,
+            "seed": args.seed,
+            "rows": {k: len(v) for k, v in data.items()},
+        },
+        "stages": stages,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
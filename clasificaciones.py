@@ -0,0 +1,239 @@
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from dates import parse_dates
+from perf import timed
+from pipeline import CLASIF_OPTS
+from rut import parse_ruts
+
+# =========================
+# Clasificaciones manuales persistentes (SQLite embebido)
+# =========================
+# Clave = (RUT_norm, Fecha ISO, Tipo_Incidencia, hash del Detalle, ocurrencia); la ocurrencia
+# numera (0, 1, ...) las filas gemelas con los mismos cuatro valores, en el orden de la tabla,
+# para que clasificar una no reclasifique a las otras. La PK es el índice de la clave, más un
+# índice por fecha para traer solo el periodo de la tabla.
+# Las ediciones se escriben como upserts en lote y, al rearmar la tabla de incidencias
+# (archivo nuevo / otro rango), lo guardado se cruza de una vez por la clave.
+# La base guarda datos por RUT: va en la carpeta de datos del usuario (no en /tmp, que es
+# compartido y se borra al reiniciar), carpeta 0700 y archivo 0600; no se usa si es de otro usuario.
+def _data_dir() -> str:
+    base = os.environ.get("XDG_DATA_HOME") or os.environ.get("LOCALAPPDATA") \
+        or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "incidencias")
+
+DB_PATH = os.environ.get("INCIDENCIAS_CLASIF_DB", os.path.join(_data_dir(), "clasificaciones.sqlite"))
+
+CLAVE = ["RUT_norm", "Fecha", "Tipo_Incidencia", "Detalle_hash", "Ocurrencia"]
+SIN_CLASIFICAR = "Seleccionar"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clasificaciones (
+    rut_norm TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    detalle_hash TEXT NOT NULL,
+    ocurrencia INTEGER NOT NULL,
+    clasificacion TEXT NOT NULL,
+    actualizado TEXT NOT NULL,
+    PRIMARY KEY (rut_norm, fecha, tipo, detalle_hash, ocurrencia)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS clasificaciones_fecha ON clasificaciones (fecha);
+"""
+
+_UPSERT = """
+INSERT INTO clasificaciones (rut_norm, fecha, tipo, detalle_hash, ocurrencia, clasificacion, actualizado)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (rut_norm, fecha, tipo, detalle_hash, ocurrencia)
+DO UPDATE SET clasificacion = excluded.clasificacion, actualizado = excluded.actualizado
+"""
+
+# base anterior (sin ocurrencia): lo guardado pasa como ocurrencia 0 (la primera gemela)
+_MIGRAR_OCURRENCIA = """
+DROP INDEX IF EXISTS clasificaciones_fecha;
+ALTER TABLE clasificaciones RENAME TO clasificaciones_v1;
+""" + _SCHEMA + """
+INSERT INTO clasificaciones (rut_norm, fecha, tipo, detalle_hash, ocurrencia, clasificacion, actualizado)
+SELECT rut_norm, fecha, tipo, detalle_hash, 0, clasificacion, actualizado FROM clasificaciones_v1;
+DROP TABLE clasificaciones_v1;
+"""
+
+def _propio(path):
+    if hasattr(os, "getuid") and os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"{path} es de otro usuario; define INCIDENCIAS_CLASIF_DB con una ruta propia.")
+
+def _preparar(db_path):
+    """
+    Carpeta (0700 si se crea) y archivo (0600, del usuario actual) de la base.
+    """
+    carpeta = os.path.dirname(os.path.abspath(db_path))
+    if not os.path.isdir(carpeta):
+        os.makedirs(carpeta, mode=0o700, exist_ok=True)
+        os.chmod(carpeta, 0o700)
+    # el archivo se crea 0600; si alguien lo dejó creado (o es un symlink) no se usa
+    os.close(os.open(db_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600))
+    _propio(db_path)
+    os.chmod(db_path, 0o600)
+
+def _connect(db_path=None):
+    db_path = db_path or DB_PATH
+    _preparar(db_path)
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    cols = [r[1] for r in con.execute("PRAGMA table_info(clasificaciones)")]
+    if cols and "ocurrencia" not in cols:
+        with con:
+            con.executescript(_MIGRAR_OCURRENCIA)
+    con.executescript(_SCHEMA)
+    return con
+
+def hash_detalle(values) -> np.ndarray:
+    """
+    Hash corto (sha1, 16 hex) por valor; se calcula una vez por valor distinto.
+    """
+    codes, uniques = pd.factorize(pd.Series(values).fillna("").astype(str))
+    hashes = np.array([hashlib.sha1(u.encode("utf-8")).hexdigest()[:16] for u in uniques], dtype=object)
+    return hashes[codes]
+
+def claves(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnas clave de cada incidencia (mismo índice que df). La ocurrencia se cuenta sobre df
+    completo: hay que pasar la tabla entera y recién después quedarse con las filas de interés.
+    """
+    fecha = parse_dates(df["Fecha"])
+    k = pd.DataFrame({
+        "RUT_norm": parse_ruts(df["RUT"])["RUT_norm"].to_numpy(),
+        "Fecha": fecha.dt.strftime("%Y-%m-%d").fillna("").to_numpy(dtype=object),
+        "Tipo_Incidencia": df["Tipo_Incidencia"].fillna("").astype(str).to_numpy(dtype=object),
+        "Detalle_hash": hash_detalle(df["Detalle"]),
+    }, index=df.index)
+    k["Ocurrencia"] = k.groupby(CLAVE[:-1], sort=False).cumcount().to_numpy(dtype="int64")
+    return k
+
+@timed("clasificaciones.guardar")
+def guardar(df: pd.DataFrame, filas=None, db_path=None, k=None) -> int:
+    """
+    Upsert en lote de la Clasificación Manual de las filas `filas` de df (None = todas).
+    df es la tabla completa (de ella sale la ocurrencia de cada clave); k: claves(df) ya
+    calculadas, para no recalcularlas en cada edición. Devuelve filas escritas.
+    """
+    k = claves(df) if k is None else k
+    if filas is not None:
+        k = k.loc[filas]
+    ok = (k["RUT_norm"] != "") & (k["Fecha"] != "") & df.loc[k.index, "Clasificación Manual"].notna()
+    if not ok.any():
+        return 0
+    k = k[ok]
+    ahora = datetime.now().isoformat(timespec="seconds")
+    filas = zip(
+        k["RUT_norm"], k["Fecha"], k["Tipo_Incidencia"], k["Detalle_hash"], k["Ocurrencia"].tolist(),
+        df.loc[k.index, "Clasificación Manual"].astype(str), [ahora] * len(k),
+    )
+    with closing(_connect(db_path)) as con, con:
+        con.executemany(_UPSERT, filas)
+    return len(k)
+
+@timed("clasificaciones.aplicar")
+def aplicar(df_incidencias: pd.DataFrame, db_path=None) -> pd.DataFrame:
+    """
+    Copia de df_incidencias con las clasificaciones guardadas (solo donde sigue "Seleccionar").
+    """
+    df = df_incidencias.copy()
+    if not len(df):
+        return df
+    k = claves(df)
+    fechas = k.loc[k["Fecha"] != "", "Fecha"]
+    if not len(fechas):
+        return df
+
+    # solo el periodo de la tabla (índice por fecha); el cruce por clave completa va en pandas
+    with closing(_connect(db_path)) as con:
+        guardadas = pd.read_sql_query(
+            "SELECT rut_norm AS RUT_norm, fecha AS Fecha, tipo AS Tipo_Incidencia, "
+            "detalle_hash AS Detalle_hash, ocurrencia AS Ocurrencia, clasificacion "
+            "FROM clasificaciones WHERE fecha BETWEEN ? AND ?",
+            con, params=(fechas.min(), fechas.max()),
+        )
+    if not len(guardadas):
+        return df
+
+    # la clave (con ocurrencia) es única en ambos lados: a lo más una guardada por fila
+    m = k.rename_axis("_fila").reset_index().merge(guardadas, on=CLAVE, how="inner").set_index("_fila")["clasificacion"]
+    pendiente = df.loc[m.index, "Clasificación Manual"].isin([SIN_CLASIFICAR]) | df.loc[m.index, "Clasificación Manual"].isna()
+    m = m[pendiente.to_numpy()]
+    df.loc[m.index, "Clasificación Manual"] = m.to_numpy()
+    return df
+
+# =========================
+# Importar un reporte ya clasificado (Excel de to_excel_bytes)
+# =========================
+COLS_IMPORT = ["Fecha", "RUT", "Tipo_Incidencia", "Detalle", "Clasificación Manual"]
+
+@timed("clasificaciones.leer_excel")
+def leer_clasificadas(file, sheet_name="Incidencias") -> pd.DataFrame:
+    """
+    Lee solo las columnas clave + Clasificación Manual de la hoja, en modo read-only (streaming,
+    sin cargar estilos por celda).
+    """
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"El archivo no tiene la hoja '{sheet_name}'.")
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+        faltan = [c for c in COLS_IMPORT if c not in header]
+        if faltan:
+            raise ValueError(f"A la hoja '{sheet_name}' le faltan columnas: {', '.join(faltan)}.")
+        idx = [header.index(c) for c in COLS_IMPORT]
+        datos = [tuple(r[i] if i < len(r) else None for i in idx) for r in rows if any(v is not None for v in r)]
+    finally:
+        wb.close()
+    return pd.DataFrame(datos, columns=COLS_IMPORT)
+
+@timed("clasificaciones.fusionar")
+def fusionar(df_incidencias: pd.DataFrame, importadas: pd.DataFrame, k=None):
+    """
+    Cruza importadas con df_incidencias por la clave y copia la Clasificación Manual (lo importado
+    manda). Las filas gemelas cruzan una a una por su ocurrencia (orden en cada tabla).
+    k: claves(df_incidencias) ya calculadas. Devuelve (df, filas actualizadas, conflictos, sin cruce, inválidas):
+    - conflictos: la tabla ya tenía otra clasificación (distinta de "Seleccionar")
+    - sin cruce: filas importadas sin incidencia con esa clave
+    - inválidas: filas importadas con un valor fuera de CLASIF_OPTS (no se aplican)
+    """
+    df = df_incidencias.copy()
+    # ocurrencia sobre todo lo importado (como en la tabla exportada), antes de filtrar
+    k_imp = claves(importadas)
+    imp = importadas[importadas["Clasificación Manual"].notna()].copy()
+    imp["Clasificación Manual"] = imp["Clasificación Manual"].astype(str).str.strip()
+    imp = imp[imp["Clasificación Manual"] != SIN_CLASIFICAR]
+    valida = imp["Clasificación Manual"].isin(CLASIF_OPTS)
+    invalidas = imp[~valida]
+    imp = imp[valida]
+
+    k_imp = k_imp.loc[imp.index].assign(Importada=imp["Clasificación Manual"].to_numpy())
+    k_df = (claves(df) if k is None else k).rename_axis("_fila").reset_index()
+
+    # la clave (con ocurrencia) no se repite: cada fila de la tabla cruza con a lo más una importada
+    m = k_df.merge(k_imp.rename_axis("_imp").reset_index(), on=CLAVE, how="inner")
+    sin_cruce = imp.loc[k_imp.index[~k_imp.index.isin(m["_imp"])]]
+
+    filas = pd.Index(m["_fila"].astype(df.index.dtype))
+    actual = df.loc[filas, "Clasificación Manual"].to_numpy(dtype=object)
+    nueva = m["Importada"].to_numpy(dtype=object)
+    conflicto = ~pd.isna(actual) & (actual != SIN_CLASIFICAR) & (actual != nueva)
+    conflictos = df.loc[filas[conflicto], ["Fecha", "RUT", "Tipo_Incidencia", "Detalle"]].assign(**{
+        "Clasificación actual": actual[conflicto],
+        "Clasificación importada": nueva[conflicto],
+    })
+
+    cambia = actual != nueva
+    df.loc[filas[cambia], "Clasificación Manual"] = nueva[cambia]
+    return (df, filas[cambia], conflictos.reset_index(drop=True), sin_cruce.reset_index(drop=True),
+            invalidas.reset_index(drop=True))
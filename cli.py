@@ -0,0 +1,134 @@
+"""
+Corrida batch (sin Streamlit): un reporte consolidado por área.
+
+    python cli.py --turnos cod.xlsx --reporte activos.xlsx --detalle detalle.xlsx \
+        --areas "AEROPUERTO SCL" "AEROPUERTO PMC" --desde 01-03-2025 --hasta 31-03-2025 --out reportes/
+
+Sin --areas se corre una vez por cada Área distinta del Reporte Turnos.
+Las áreas se procesan en paralelo (un proceso por área, hasta --workers).
+--turnos / --reporte / --detalle aceptan varios archivos (xlsx, csv o parquet).
+"""
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import perf
+from ingest import load_detalle, load_tabla
+from pipeline import (
+    detect_rut_cols,
+    find_col,
+    normalizar,
+    run_pipeline,
+    to_excel_bytes,
+)
+
+# frames normalizados, compartidos con cada proceso del pool (initializer)
+_NORMALIZADO = None
+_INPUTS = None
+
+def _init_worker(inputs, normalizado):
+    global _INPUTS, _NORMALIZADO
+    _INPUTS = inputs
+    _NORMALIZADO = normalizado
+
+def read_files(paths):
+    out = []
+    for path in paths:
+        with open(path, "rb") as f:
+            out.append((os.path.basename(path), f.read()))
+    return out
+
+def parse_fecha(value):
+    if value is None:
+        return None
+    d = pd.to_datetime(value, dayfirst=True, errors="coerce")
+    if pd.isna(d):
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {value}")
+    return d.date()
+
+def area_slug(area) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(area)).strip("_").lower() or "todas"
+
+def list_areas(df_activos):
+    area_col = find_col(df_activos, ["Área", "Area", "AREA"])
+    if not area_col:
+        return [""]
+    return sorted(df_activos[area_col].dropna().astype(str).str.strip().unique().tolist())
+
+def run_area(area, desde, hasta, min_inc_h, out_dir):
+    df_activos, df_inasist, df_asist = _INPUTS
+    perf.start_run(f"cli:{area}")
+    try:
+        sheets = run_pipeline(
+            df_activos, df_inasist, df_asist,
+            only_area=area, area_exacta=True, desde=desde, hasta=hasta, min_inc_h=min_inc_h,
+            normalizado=_NORMALIZADO,
+        )
+    except ValueError as e:
+        perf.end_run()
+        return area, None, str(e)
+
+    path = os.path.join(out_dir, f"reporte_incidencias_{area_slug(area)}.xlsx")
+    with open(path, "wb") as f:
+        f.write(to_excel_bytes(sheets, dropdown_sheet_name="Incidencias").getvalue())
+    perf.end_run()
+    return area, path, f"{len(sheets['Incidencias'])} incidencias"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reporte de incidencias por área (batch).")
+    parser.add_argument("--turnos", nargs="+", required=True, help="Codificación Turnos BUK (xlsx/csv/parquet)")
+    parser.add_argument("--reporte", nargs="+", required=True, help="Reporte Turnos (Activos + Turnos) (xlsx/csv/parquet)")
+    parser.add_argument("--detalle", nargs="+", required=True,
+                        help="Detalle Turnos Colaboradores (xlsx: Hoja1=Inasistencias, Hoja2=Asistencias; csv/parquet: una tabla)")
+    parser.add_argument("--areas", nargs="*", default=None, help="Áreas a procesar (nombre exacto, sin distinguir mayúsculas)")
+    parser.add_argument("--desde", type=parse_fecha, default=None, help="DD-MM-AAAA (por defecto, primera fecha del área)")
+    parser.add_argument("--hasta", type=parse_fecha, default=None, help="DD-MM-AAAA (por defecto, última fecha del área)")
+    parser.add_argument("--min-inc-h", type=float, default=0.0, help="Tiempo mínimo incidencia (horas)")
+    parser.add_argument("--out", default=".", help="Carpeta de salida")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos en paralelo")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+
+    # varios archivos por entrada: hojas / archivos se parsean en paralelo (ingest.py)
+    try:
+        load_tabla(read_files(args.turnos), args.workers)  # por ahora no se usa, queda listo para reglas futuras
+        df_activos, _ = load_tabla(read_files(args.reporte), args.workers)
+        df_inasist, df_asist, _ = load_detalle(read_files(args.detalle), args.workers)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        rut_col_inas, rut_col_as = detect_rut_cols(df_inasist, df_asist)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    normalizado = normalizar(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as)
+
+    areas = args.areas if args.areas else list_areas(df_activos)
+    inputs = (df_activos, df_inasist, df_asist)
+
+    errores = 0
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.workers or 1, len(areas))),
+        initializer=_init_worker,
+        initargs=(inputs, normalizado),
+    ) as pool:
+        futures = [pool.submit(run_area, a, args.desde, args.hasta, args.min_inc_h, args.out) for a in areas]
+        for fut in as_completed(futures):
+            area, path, msg = fut.result()
+            if path is None:
+                errores += 1
+                print(f"[{area}] ERROR: {msg}", file=sys.stderr)
+            else:
+                print(f"[{area}] {msg} -> {path}")
+
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+from dates import parse_dates
+from perf import timed
+from rut import parse_ruts
+
+# =========================
+# Cubo de incidencias para drill-down (todo el aeropuerto)
+# =========================
+# Conteo de incidencias al grano (RUT, día, Área, Supervisor, Especialidad, tipo,
+# clasificación), armado una vez por ingesta. Cada vista (por área, supervisor, ...) es
+# filtrar y sumar el cubo, sin volver a correr el pipeline. Las ediciones de la
+# clasificación entran como deltas (-1 en la celda anterior, +1 en la nueva) y solo tocan
+# esas celdas: las que ya existen se suman en su lugar (posición por clave en un dict) y las
+# nuevas quedan pendientes hasta la próxima consulta. Las celdas en cero no se muestran y se
+# compactan cuando pasan de la mitad del cubo.
+DIMENSIONES = ["RUT_norm", "Día", "Área", "Supervisor", "Especialidad", "Tipo_Incidencia", "Clasificación Manual"]
+SIN_VALOR = "(sin dato)"
+
+def area_por_rut(df_activos, area_col) -> pd.Series:
+    """
+    RUT_key -> Área (primera del Reporte Turnos); vacía si no hay columna de área.
+    """
+    if not area_col or area_col not in df_activos.columns:
+        return pd.Series(dtype=object)
+    dim = df_activos.loc[df_activos["RUT_key"] >= 0, ["RUT_key", area_col]].drop_duplicates("RUT_key")
+    return pd.Series(dim[area_col].astype(str).to_numpy(), index=dim["RUT_key"].to_numpy())
+
+def _texto(s: pd.Series) -> pd.Series:
+    s = s.astype(object)
+    return s.where(s.notna() & (s.astype(str).str.strip() != ""), SIN_VALOR).astype(str)
+
+class CuboIncidencias:
+    def __init__(self, df_incidencias, areas: pd.Series):
+        self.areas = areas
+        self.data = self._agrupar(self._filas(df_incidencias, 1))
+        self._indexar()
+
+    def _indexar(self):
+        self._pos = dict(zip(self._claves(self.data), range(len(self.data))))  # clave -> fila de data
+        self._nuevas = {}                                                       # clave -> cantidad
+
+    @staticmethod
+    def _claves(df):
+        return zip(*(df[c].tolist() for c in DIMENSIONES))
+
+    def _filas(self, df, signo) -> pd.DataFrame:
+        ruts = parse_ruts(df["RUT"])
+        area = self.areas.reindex(ruts["RUT_key"].to_numpy())
+        return pd.DataFrame({
+            "RUT_norm": ruts["RUT_norm"].to_numpy(),
+            "Día": parse_dates(df["Fecha"]).dt.normalize().to_numpy(),
+            "Área": _texto(pd.Series(area.to_numpy())).to_numpy(),
+            "Supervisor": _texto(df["Supervisor"]).to_numpy(),
+            "Especialidad": _texto(df["Especialidad"]).to_numpy(),
+            "Tipo_Incidencia": _texto(df["Tipo_Incidencia"]).to_numpy(),
+            "Clasificación Manual": _texto(df["Clasificación Manual"]).to_numpy(),
+            "Cantidad": signo,
+        })
+
+    @staticmethod
+    def _agrupar(filas) -> pd.DataFrame:
+        g = filas.groupby(DIMENSIONES, dropna=False, observed=True, sort=False)["Cantidad"].sum().reset_index()
+        g = g[g["Cantidad"] != 0].reset_index(drop=True)
+        # dimensiones de texto como category: filtrar es comparar códigos
+        return g.astype({c: "category" for c in DIMENSIONES if c != "Día"})
+
+    @timed("cubo.aplicar")
+    def aplicar(self, quitar, poner):
+        """
+        Deltas de clasificación: filas antes (quitar) y después (poner) de la edición.
+        Costo proporcional a las filas editadas, no al tamaño del cubo.
+        """
+        partes = [self._filas(f, signo) for f, signo in [(quitar, -1), (poner, 1)] if len(f)]
+        if not partes:
+            return
+        delta = (pd.concat(partes, ignore_index=True)
+                 .groupby(DIMENSIONES, dropna=False, sort=False)["Cantidad"].sum().reset_index())
+        pos, suma = [], []
+        for clave, n in zip(self._claves(delta), delta["Cantidad"].tolist()):
+            if not n:
+                continue
+            p = self._pos.get(clave)
+            if p is None:
+                self._nuevas[clave] = self._nuevas.get(clave, 0) + n
+            else:
+                pos.append(p)
+                suma.append(n)
+        if pos:
+            pos = np.asarray(pos)
+            j = self.data.columns.get_loc("Cantidad")
+            self.data.iloc[pos, j] = self.data["Cantidad"].to_numpy()[pos] + np.asarray(suma)
+
+    def _consolidar(self):
+        """
+        Antes de leer: agrega las celdas nuevas pendientes y compacta si sobran ceros.
+        """
+        nuevas = {k: n for k, n in self._nuevas.items() if n}
+        self._nuevas = {}
+        if nuevas:
+            filas = pd.DataFrame(list(nuevas), columns=DIMENSIONES).assign(Cantidad=list(nuevas.values()))
+            data = self.data
+            for c in DIMENSIONES:
+                if c == "Día":
+                    filas[c] = filas[c].astype(data[c].dtype)
+                    continue
+                faltan = pd.Index(filas[c].unique()).difference(data[c].cat.categories)
+                if len(faltan):
+                    data[c] = data[c].cat.add_categories(faltan)
+                filas[c] = filas[c].astype(data[c].dtype)
+            self.data = pd.concat([data, filas.astype({"Cantidad": data["Cantidad"].dtype})], ignore_index=True)
+            self._pos.update(zip(nuevas, range(len(data), len(self.data))))
+        ceros = self.data["Cantidad"].to_numpy() == 0
+        if ceros.sum() > len(self.data) // 2:
+            data = self.data[~ceros].reset_index(drop=True)
+            for c in DIMENSIONES:
+                if c != "Día":
+                    data[c] = data[c].cat.remove_unused_categories()
+            self.data = data
+            self._indexar()
+
+    def opciones(self, dim) -> list:
+        self._consolidar()
+        d = self.data
+        return sorted(d.loc[d["Cantidad"].to_numpy() != 0, dim].unique().tolist())
+
+    def consultar(self, filtros=None, por=("Área",), desde=None, hasta=None) -> pd.DataFrame:
+        """
+        filtros: {dimensión: [valores]} (vacío = todos). Devuelve la suma por `por`, con una
+        columna por Clasificación Manual más el total.
+        """
+        self._consolidar()
+        d = self.data
+        mask = pd.Series(d["Cantidad"].to_numpy() != 0, index=d.index)
+        for dim, valores in (filtros or {}).items():
+            if valores:
+                mask &= d[dim].isin(valores)
+        if desde is not None:
+            mask &= d["Día"] >= pd.Timestamp(desde)
+        if hasta is not None:
+            mask &= d["Día"] <= pd.Timestamp(hasta)
+        d = d[mask]
+
+        por = list(por) or ["Tipo_Incidencia"]
+        if not len(d):
+            return pd.DataFrame(columns=por + ["Total"])
+        tabla = d.pivot_table(index=por, columns="Clasificación Manual", values="Cantidad",
+                              aggfunc="sum", fill_value=0, observed=True)
+        tabla.columns = list(tabla.columns)
+        tabla["Total"] = tabla.sum(axis=1)
+        return tabla.sort_values("Total", ascending=False).reset_index()
@@ -0,0 +1,74 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# =========================
+# Fechas: formato detectado una vez por columna, parseo vectorizado por valor distinto
+# =========================
+# Una columna de fechas repite pocos valores (días del periodo), así que se parsea cada
+# valor distinto una vez y se reparte a todas las filas. Soporta fechas ya tipadas,
+# seriales de Excel y texto; el texto usa el formato que más calza en una muestra y lo
+# que no calce se infiere valor a valor (día primero).
+FORMATOS = [
+    "%d-%m-%Y", "%d/%m/%Y", "%Y-%m-%d",
+    "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S",
+    "%d-%m-%Y %H:%M", "%d/%m/%Y %H:%M",
+]
+_EXCEL_ORIGEN = pd.Timestamp("1899-12-30")
+_SERIAL_MIN, _SERIAL_MAX = 1, 109574  # 1900-01-01 .. 2199-12-31
+_MUESTRA = 200
+
+def detect_format(textos: pd.Series):
+    """
+    Formato de FORMATOS que más valores de la muestra parsea (None si ninguno).
+    """
+    muestra = textos.head(_MUESTRA)
+    if not len(muestra):
+        return None
+    aciertos = {f: pd.to_datetime(muestra, format=f, errors="coerce").notna().sum() for f in FORMATOS}
+    fmt = max(aciertos, key=aciertos.get)
+    return fmt if aciertos[fmt] else None
+
+def _parse_unicos(u: pd.Series) -> np.ndarray:
+    out = np.full(len(u), pd.NaT, dtype=object)
+    tipo = u.map(type)
+
+    # fechas ya tipadas (datetime / date / Timestamp)
+    es_fecha = tipo.map(lambda t: issubclass(t, (datetime, date, np.datetime64))).to_numpy(dtype=bool)
+    if es_fecha.any():
+        out[es_fecha] = pd.to_datetime(u[es_fecha], errors="coerce").to_numpy(dtype=object)
+
+    # números: serial de Excel (días desde 1899-12-30)
+    es_num = tipo.map(lambda t: issubclass(t, (int, float, np.number)) and not issubclass(t, bool)).to_numpy(dtype=bool)
+    if es_num.any():
+        n = pd.to_numeric(u[es_num], errors="coerce")
+        n = n.where((n >= _SERIAL_MIN) & (n <= _SERIAL_MAX))
+        out[es_num] = (_EXCEL_ORIGEN + pd.to_timedelta(n, unit="D")).to_numpy(dtype=object)
+
+    # texto: un formato para toda la columna; el resto, inferencia por valor
+    es_txt = ~(es_fecha | es_num)
+    if es_txt.any():
+        textos = u[es_txt].astype(str).str.strip()
+        fmt = detect_format(textos)
+        parsed = pd.to_datetime(textos, format=fmt, errors="coerce") if fmt else pd.Series(pd.NaT, index=textos.index)
+        resto = parsed.isna() & (textos != "")
+        if resto.any():
+            parsed = parsed.astype(object)
+            parsed[resto] = pd.to_datetime(textos[resto], format="mixed", dayfirst=True, errors="coerce")
+        out[es_txt] = parsed.to_numpy(dtype=object)
+
+    return out
+
+def parse_dates(values) -> pd.Series:
+    """
+    Columna -> datetime64 (NaT si no se reconoce), mismo índice.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    u = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+    # el último elemento cubre los nulos (código -1 de factorize)
+    fechas = pd.to_datetime(np.append(_parse_unicos(u), pd.NaT), errors="coerce")
+    return pd.Series(fechas[codes], index=values.index)
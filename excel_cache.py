@@ -0,0 +1,150 @@
+import getpass
+import hashlib
+import json
+import numbers
+import os
+import tempfile
+from datetime import date, datetime
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from perf import timed
+
+# =========================
+# Cache en disco de planillas parseadas (compartido entre sesiones)
+# =========================
+# Clave = sha256 de los bytes subidos + índice de hoja. Se guarda en Parquet y se
+# lee con memory map; si Arrow no puede representar la hoja (tipos mezclados en
+# una columna) no se cachea. Nada se deserializa con pickle: los nombres de columna
+# van como JSON. La carpeta es por usuario y solo él la puede leer/escribir (0700).
+# Tamaño acotado con desalojo LRU (por mtime).
+def _usuario() -> str:
+    if hasattr(os, "getuid"):
+        return str(os.getuid())
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "default"
+
+CACHE_DIR = os.environ.get("INCIDENCIAS_CACHE_DIR",
+                           os.path.join(tempfile.gettempdir(), f"incidencias_cache-{_usuario()}"))
+CACHE_MAX_MB = float(os.environ.get("INCIDENCIAS_CACHE_MAX_MB", "512"))
+
+_COLS_META = b"incidencias_columns"
+
+def file_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _path(cache_dir, key, sheet_index):
+    return os.path.join(cache_dir, f"{key}_{sheet_index}.parquet")
+
+def _cache_dir_ok(cache_dir) -> bool:
+    """
+    Crea la carpeta con modo 0700; False si existe y es de otro usuario (no se usa).
+    """
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):
+        if os.stat(cache_dir).st_uid != os.getuid():
+            return False
+        os.chmod(cache_dir, 0o700)
+    return True
+
+def _col_to_json(c):
+    # encabezados de la grilla pueden ser fechas; el resto se guarda como texto / número
+    if isinstance(c, (datetime, date)):
+        return ["ts", pd.Timestamp(c).isoformat()]
+    if isinstance(c, numbers.Integral) and not isinstance(c, bool):
+        return ["num", int(c)]
+    if isinstance(c, numbers.Real):
+        return ["num", float(c)]
+    return ["str", str(c)]
+
+def _col_from_json(par):
+    kind, v = par
+    return pd.Timestamp(v) if kind == "ts" else v
+
+def _write_parquet(df: pd.DataFrame, path):
+    # Parquet exige nombres de columna string: se guardan por posición y los
+    # nombres originales (pueden ser fechas) van como JSON en la metadata del archivo
+    tmp = df.copy()
+    tmp.columns = [str(i) for i in range(len(df.columns))]
+    table = pa.Table.from_pandas(tmp)
+    cols = json.dumps([_col_to_json(c) for c in df.columns]).encode()
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _COLS_META: cols})
+    pq.write_table(table, path)
+
+def _read_parquet(path) -> pd.DataFrame:
+    table = pq.read_table(path, memory_map=True)
+    df = table.to_pandas()
+    df.columns = [_col_from_json(par) for par in json.loads(table.schema.metadata[_COLS_META])]
+    return df
+
+def _atomic_write(writer, obj, path):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        writer(obj, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def evict_lru(cache_dir=None, max_mb=None):
+    """
+    Borra los archivos menos usados hasta quedar bajo max_mb.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = (CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st_ = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st_.st_mtime, st_.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+@timed("ingest (cache disco)")
+def read_sheet_cached(data: bytes, sheet_index, reader, key=None, cache_dir=None, max_mb=None):
+    """
+    Devuelve (df, hit). reader(BytesIO, sheet_index) se usa solo si no está en cache.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    if not _cache_dir_ok(cache_dir):
+        return reader(BytesIO(data), sheet_index), False
+    key = key or file_sha256(data)
+    path = _path(cache_dir, key, sheet_index)
+
+    if os.path.exists(path):
+        try:
+            df = _read_parquet(path)
+        except Exception:
+            # archivo corrupto o borrado a medias: se vuelve a parsear
+            pass
+        else:
+            os.utime(path)  # LRU
+            return df, True
+
+    df = reader(BytesIO(data), sheet_index)
+    try:
+        _atomic_write(_write_parquet, df, path)
+    except (pa.ArrowException, ValueError, TypeError):
+        # Arrow no representa la hoja (tipos mezclados): se usa sin cachear
+        return df, False
+    evict_lru(cache_dir, max_mb)
+    return df, False
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline import to_excel_bytes
+
+# =========================
+# Export Excel bajo demanda, en segundo plano
+# =========================
+# El Excel consolidado solo se arma cuando se pide: se encola en un hilo y la UI lee
+# el avance. Los resultados quedan en memoria por clave (hash de las hojas exportadas),
+# así volver a descargar un reporte sin cambios no vuelve a pasar por openpyxl.
+class ExportJob:
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.future = None
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    @property
+    def error(self):
+        return self.future.exception() if self.done else None
+
+    def result(self) -> bytes:
+        return self.future.result()
+
+    def _set_progress(self, fraccion):
+        self.progress = fraccion
+
+class ExportJobs:
+    def __init__(self, max_entries=4, workers=1):
+        self.max_entries = max_entries
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)  # LRU
+            return job
+
+    def submit(self, key, dfs: dict, dropdown_sheet_name="Incidencias") -> ExportJob:
+        """
+        Encola el export de dfs (si esa clave no está ya en curso o lista) y devuelve el job.
+        dfs no debe modificarse después: el hilo lo lee mientras escribe.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.error is None:
+                return job
+            job = ExportJob(key)
+            job.future = self._pool.submit(self._run, job, dfs, dropdown_sheet_name)
+            self._jobs[key] = job
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+            return job
+
+    @staticmethod
+    def _run(job, dfs, dropdown_sheet_name):
+        out = to_excel_bytes(dfs, dropdown_sheet_name=dropdown_sheet_name, progress=job._set_progress)
+        job.progress = 1.0
+        return out.getvalue()
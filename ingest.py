@@ -0,0 +1,139 @@
+import csv
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from excel_cache import file_sha256, read_sheet_cached
+from perf import timed
+from pipeline import excel_to_df
+from schema import SCHEMAS, apply_dtypes, resolve as resolve_schema, schema_key
+
+# =========================
+# Ingesta de varios archivos (xlsx, csv, parquet) en paralelo
+# =========================
+# Cada archivo es una tarea (en xlsx, una tarea lee todas sus hojas: los bytes viajan una
+# vez al proceso y el libro se abre una vez); las tareas se parsean en un pool de procesos
+# (contexto "spawn": la app corre en un servidor con hilos, donde fork no es seguro) y se
+# concatenan. Cada fila lleva su origen: Archivo_origen (sha256 del archivo) y Fila_origen
+# (posición en su hoja). Solo se descartan filas con el mismo origen, o sea el mismo archivo
+# subido dos veces; dentro de un archivo nunca se junta nada. Un csv / parquet del Detalle
+# trae una sola tabla: se reconoce como Asistencias si tiene "Fecha Entrada" o "Retraso (horas)".
+ORIGEN = ["Archivo_origen", "Fila_origen"]
+FORMATOS = ["xlsx", "csv", "parquet"]
+
+def extension(name) -> str:
+    return os.path.splitext(str(name))[1].lower().lstrip(".")
+
+def _delimiter(data: bytes) -> str:
+    muestra = data[:8192].decode("utf-8-sig", errors="ignore")
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+def header(name, data: bytes, sheet_index=0):
+    ext = extension(name)
+    if ext == "parquet":
+        return pq.read_schema(BytesIO(data)).names
+    if ext == "csv":
+        return pd.read_csv(BytesIO(data), sep=_delimiter(data), nrows=0, encoding="utf-8-sig").columns
+    return pd.read_excel(BytesIO(data), sheet_name=sheet_index, engine="openpyxl", nrows=0).columns
+
+def read_source(name, data: bytes, sheet_index=0, schema_name=None):
+    """
+    Una hoja / tabla -> (df, hit del cache en disco). Con schema_name solo las columnas mapeadas.
+    """
+    ext = extension(name)
+    schema = SCHEMAS[schema_name] if schema_name else None
+    if ext == "xlsx":
+        if schema is None:
+            return read_sheet_cached(data, sheet_index, excel_to_df, key=file_sha256(data))
+        reader = functools.partial(excel_to_df, schema=schema)
+        return read_sheet_cached(data, sheet_index, reader, key=f"{file_sha256(data)}_{schema_key(schema_name)}")
+
+    if ext not in ("csv", "parquet"):
+        raise ValueError(f"Formato no soportado: {name} (se aceptan {', '.join(FORMATOS)}).")
+    mapa = resolve_schema(header(name, data), schema) if schema else None
+    cols = list(mapa.values()) if mapa else None
+    if ext == "parquet":
+        df = pd.read_parquet(BytesIO(data), columns=cols)
+    else:
+        sep = _delimiter(data)
+        # con ";" como separador la coma es el decimal (planillas en español)
+        df = pd.read_csv(BytesIO(data), sep=sep, decimal="," if sep == ";" else ".", usecols=cols,
+                         encoding="utf-8-sig", low_memory=False)
+    if mapa:
+        df = apply_dtypes(df.rename(columns={real: canon for canon, real in mapa.items()}), schema)
+    return df, False
+
+def _tarea(args):
+    name, data, hojas = args
+    sha = file_sha256(data)
+    out = []
+    for sheet_index, schema_name in hojas:
+        df, hit = read_source(name, data, sheet_index, schema_name)
+        df["Archivo_origen"] = sha
+        df["Fila_origen"] = np.arange(len(df), dtype="int64")
+        out.append((df, hit))
+    return out
+
+def es_asistencias(name, data: bytes) -> bool:
+    mapa = resolve_schema(header(name, data), SCHEMAS["asistencias"])
+    return "Fecha Entrada" in mapa or "Retraso (horas)" in mapa
+
+@timed("ingest (multi-archivo)")
+def parse_all(tareas, workers=None) -> list:
+    """
+    tareas: [(nombre, bytes, [(hoja, schema), ...])] -> [[(df, hit) por hoja]] en el mismo orden.
+    Con una sola tarea no se abre pool.
+    """
+    if len(tareas) <= 1:
+        return [_tarea(t) for t in tareas]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tareas)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_tarea, tareas))
+
+def _concat(partes, schema_name=None) -> pd.DataFrame:
+    if not partes:
+        return pd.DataFrame(columns=ORIGEN)
+    df = partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+    # el mismo archivo subido dos veces: mismo origen; filas de un mismo archivo nunca se juntan
+    df = df.drop_duplicates(ORIGEN).reset_index(drop=True)
+    df["Archivo_origen"] = df["Archivo_origen"].astype("category")
+    # category con categorías distintas por archivo queda object al concatenar
+    return apply_dtypes(df, SCHEMAS[schema_name]) if schema_name else df
+
+def load_tabla(files, workers=None):
+    """
+    files: [(nombre, bytes)] de una tabla sin esquema (Reporte Turnos, Codificación) -> (df, hits).
+    Un archivo repetido entra una vez; las columnas (p. ej. días) se unen.
+    """
+    out = parse_all([(name, data, [(0, None)]) for name, data in files], workers)
+    df = _concat([df for hojas in out for df, _ in hojas]).drop(columns=ORIGEN)
+    return df, [hit for hojas in out for _, hit in hojas]
+
+def load_detalle(files, workers=None):
+    """
+    files: [(nombre, bytes)] del Detalle -> (df_inasist, df_asist, hits).
+    xlsx: Hoja1 = Inasistencias, Hoja2 = Asistencias; csv / parquet: una tabla, según columnas.
+    """
+    tareas = []
+    for name, data in files:
+        if extension(name) == "xlsx":
+            tareas.append((name, data, [(0, "inasistencias"), (1, "asistencias")]))
+        else:
+            tareas.append((name, data, [(0, "asistencias" if es_asistencias(name, data) else "inasistencias")]))
+    out = parse_all(tareas, workers)
+    partes = {"inasistencias": [], "asistencias": []}
+    hits = []
+    for (_, _, hojas), leidas in zip(tareas, out):
+        for (_, schema_name), (df, hit) in zip(hojas, leidas):
+            partes[schema_name].append(df)
+            hits.append(hit)
+    return _concat(partes["inasistencias"], "inasistencias"), _concat(partes["asistencias"], "asistencias"), hits
@@ -0,0 +1,62 @@
+import math
+
+import pandas as pd
+
+# =========================
+# Editor paginado: filtros y página del lado del servidor
+# =========================
+# La tabla maestra de incidencias queda en el servidor; al navegador solo va la página
+# visible. Los filtros son máscaras vectorizadas sobre la maestra y las ediciones vuelven
+# a ella por el índice de fila (clave estable de construir_incidencias).
+ESTADOS = ["Todas", "Sin clasificar", "Clasificadas"]
+SIN_CLASIFICAR = "Seleccionar"
+
+def _rut_busqueda(s) -> pd.Series:
+    return s.astype(str).str.replace(".", "", regex=False).str.replace(" ", "", regex=False).str.upper()
+
+def filtrar(df: pd.DataFrame, desde=None, hasta=None, rut="", supervisores=(), tipos=(), estado="Todas"):
+    """
+    Filas de df que cumplen todos los filtros (vacío = sin filtro); mismo índice que df.
+    rut: texto contenido en el RUT (sin puntos ni espacios, sin distinguir mayúsculas).
+    """
+    mask = pd.Series(True, index=df.index)
+    if desde is not None:
+        mask &= df["Fecha"] >= pd.Timestamp(desde)
+    if hasta is not None:
+        mask &= df["Fecha"] < pd.Timestamp(hasta) + pd.Timedelta(days=1)
+    rut = _rut_busqueda(pd.Series([rut or ""])).iloc[0]
+    if rut:
+        mask &= _rut_busqueda(df["RUT"]).str.contains(rut, regex=False, na=False)
+    if supervisores:
+        mask &= df["Supervisor"].isin(supervisores)
+    if tipos:
+        mask &= df["Tipo_Incidencia"].isin(tipos)
+    if estado != "Todas":
+        sin = df["Clasificación Manual"].isna() | (df["Clasificación Manual"] == SIN_CLASIFICAR)
+        mask &= sin if estado == "Sin clasificar" else ~sin
+    return df[mask.to_numpy()]
+
+def n_paginas(n_filas, tam) -> int:
+    return max(1, math.ceil(n_filas / tam))
+
+def pagina(df: pd.DataFrame, n, tam) -> pd.DataFrame:
+    """
+    Página n (desde 1) de tamaño tam.
+    """
+    ini = (n - 1) * tam
+    return df.iloc[ini:ini + tam]
+
+def merge_pagina(maestra: pd.DataFrame, editada: pd.DataFrame, cols=("Clasificación Manual",)) -> pd.Index:
+    """
+    Copia a la maestra (en su lugar) las columnas editadas de la página, por índice de fila.
+    Devuelve las filas que cambiaron.
+    """
+    cols = list(cols)
+    idx = editada.index.intersection(maestra.index)
+    antes = maestra.loc[idx, cols]
+    despues = editada.loc[idx, cols]
+    distinto = ~((antes == despues) | (antes.isna() & despues.isna())).all(axis=1)
+    cambiadas = idx[distinto.to_numpy()]
+    if len(cambiadas):
+        maestra.loc[cambiadas, cols] = despues.loc[cambiadas].to_numpy()
+    return cambiadas
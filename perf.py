@@ -0,0 +1,119 @@
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# =========================
+# Instrumentación por etapa (tiempo, delta de RSS pico, filas entrada/salida)
+# =========================
+# Cada rerun de la app (o corrida batch) abre un "run"; las etapas decoradas con
+# @timed o envueltas en `with stage(...)` quedan registradas en el run del hilo actual.
+# Al cerrar el run se agregan como líneas JSON a PERF_LOG (vacío = no escribir).
+PERF_LOG = os.environ.get("INCIDENCIAS_PERF_LOG", os.path.join(tempfile.gettempdir(), "incidencias_perf.jsonl"))
+
+_local = threading.local()
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux entrega KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def count_rows(obj):
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(count_rows(v) for v in obj.values())
+    if isinstance(obj, (tuple, list)):
+        return sum(count_rows(v) for v in obj)
+    return 0
+
+class PerfRun:
+    def __init__(self, name="app"):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.records = []
+
+    def add(self, **rec):
+        self.records.append(rec)
+
+    def to_frame(self) -> pd.DataFrame:
+        cols = ["stage", "seconds", "rss_delta_mb", "rows_in", "rows_out"]
+        return pd.DataFrame(self.records, columns=cols)
+
+def start_run(name="app") -> PerfRun:
+    _local.run = PerfRun(name)
+    return _local.run
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def end_run(path=None):
+    """
+    Escribe el run actual como JSON lines (una línea por etapa) y lo cierra.
+    """
+    run = current_run()
+    _local.run = None
+    path = PERF_LOG if path is None else path
+    if run is None or not path or not run.records:
+        return run
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            for rec in run.records:
+                f.write(json.dumps({"run": run.run_id, "name": run.name, "ts": run.started, **rec},
+                                   ensure_ascii=False) + "\n")
+    except OSError:
+        # el log es best-effort: nunca debe botar la app
+        pass
+    return run
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    with stage("ingest", rows_in=...) as rec:
+        ...
+        rec["rows_out"] = len(df)
+    """
+    rec = {"stage": name, "rows_in": rows_in, "rows_out": None}
+    rss0 = _peak_rss_mb()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 4)
+        rss1 = _peak_rss_mb()
+        rec["rss_delta_mb"] = None if rss0 is None else round(rss1 - rss0, 1)
+        run = current_run()
+        if run is not None:
+            run.add(**rec)
+
+def timed(name):
+    """
+    Decorador: registra la función como etapa; filas = DataFrames en args / resultado.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current_run() is None:
+                return fn(*args, **kwargs)
+            with stage(name, rows_in=count_rows(args) + count_rows(kwargs)) as rec:
+                out = fn(*args, **kwargs)
+                rec["rows_out"] = count_rows(out)
+            return out
+        return wrapper
+    return deco
@@ -0,0 +1,700 @@
+"""
+Pipeline de incidencias / ausentismo / asistencia, sin UI.
+Lo usan app.py (Streamlit, con cache por etapa) y cli.py (batch por área).
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import NamedStyle, PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from dates import parse_dates
+from perf import timed
+from rut import parse_ruts, reporte_ruts
+from schema import apply_dtypes, resolve as resolve_schema
+from shift_grid import ShiftGrid
+
+# =========================
+# Config
+# =========================
+CABIFY = {
+    "m1": "1F123F",
+    "m2": "362065",
+    "m3": "4A2B8D",
+    "m4": "5B34AC",
+    "m5": "7145D6",
+    "m6": "8A6EE4",
+    "m7": "A697ED",
+    "m8": "C4BDF5",
+    "m9": "DFDAF8",
+    "m10": "F5F1FC",
+    "m11": "FAF8FE",
+    "pink": "E83C96",
+    "red": "E74A41",
+    "orange": "EA8C2E",
+    "yellow": "EFBD03",
+    "blue": "4583D4",
+    "green": "0C936B",  # tu input decía #OC936B (O letra). Debe ser 0 (cero)
+}
+
+CLASIF_OPTS = ["Seleccionar", "Injustificada", "Permiso", "No Procede - Cambio de Turno"]
+
+# =========================
+# Helpers
+# =========================
+@timed("excel_to_df")
+def excel_to_df(file, sheet_index=0, schema=None):
+    """
+    schema: lista de Campo (schema.py); si viene, se leen solo esas columnas, con nombre
+    canónico y dtype. Sin schema se lee la hoja completa.
+    Con schema la hoja se recorre una sola vez (openpyxl read-only): el encabezado sale de la
+    primera fila y de cada fila se guardan solo las columnas mapeadas. openpyxl igual parsea
+    el XML de todas las celdas; lo que se ahorra es armar y tipar las columnas que no se usan.
+    """
+    if schema is None:
+        return pd.read_excel(file, sheet_name=sheet_index, engine="openpyxl")
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[sheet_index].iter_rows(values_only=True)
+        header = [c if c is not None else "" for c in next(rows, ())]
+        mapa = resolve_schema(header, schema)
+        pos = {canon: header.index(real) for canon, real in mapa.items()}
+        datos = [
+            tuple(r[i] if i < len(r) else None for i in pos.values())
+            for r in rows if any(v is not None for v in r)
+        ]
+    finally:
+        wb.close()
+    return apply_dtypes(pd.DataFrame(datos, columns=list(pos)), schema)
+
+@functools.lru_cache(maxsize=64)
+def _norm_map(columns: tuple) -> dict:
+    return {str(c).strip().lower(): c for c in columns}
+
+def find_col(df: pd.DataFrame, candidates):
+    # el mapa de nombres se arma una vez por encabezado (no en cada llamada)
+    norm_map = _norm_map(tuple(df.columns))
+    for cand in candidates:
+        k = str(cand).strip().lower()
+        if k in norm_map:
+            return norm_map[k]
+    # match suave
+    for cand in candidates:
+        k = str(cand).strip().lower()
+        for kk, real in norm_map.items():
+            if kk == k:
+                return real
+    return None
+
+def get_num(df, candidates):
+    col = find_col(df, candidates if isinstance(candidates, list) else [candidates])
+    if not col:
+        return pd.Series([0.0] * len(df))
+    return pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+
+def safe_text_series(df, candidates, default=""):
+    col = find_col(df, candidates)
+    if not col:
+        return pd.Series([default] * len(df))
+    return df[col].astype(str).fillna(default)
+
+def maybe_filter_area(df, only_area_value, exacta=False):
+    """
+    Filtra por Área sin distinguir mayúsculas: texto contenido (app) o valor exacto sin espacios
+    extremos (exacta=True, CLI por área). El texto es literal, no regex.
+    """
+    if not only_area_value:
+        return df
+    area_col = find_col(df, ["Área", "Area", "AREA"])
+    if not area_col:
+        return df
+    areas = df[area_col].astype(str).str.strip().str.upper()
+    buscado = str(only_area_value).strip().upper()
+    mask = (areas == buscado) if exacta else areas.str.contains(buscado, regex=False, na=False)
+    return df[mask.to_numpy()].copy()
+
+def split_fullname(fullname: str):
+    """
+    Intenta separar: Nombre(s) + 1er Apellido + 2do Apellido
+    Regla simple: últimos 2 tokens = apellidos, resto = nombre(s)
+    """
+    if not fullname or pd.isna(fullname):
+        return "", "", ""
+    toks = str(fullname).strip().split()
+    if len(toks) == 1:
+        return toks[0], "", ""
+    if len(toks) == 2:
+        return toks[0], toks[1], ""
+    nombre = " ".join(toks[:-2])
+    ap1 = toks[-2]
+    ap2 = toks[-1]
+    return nombre, ap1, ap2
+
+# =========================
+# Excel styling + dropdown
+# =========================
+# Export en modo write-only (streaming, memoria constante): las filas se escriben y se
+# descargan a disco a medida que se agregan. El look Cabify va con estilos compartidos:
+# header y fechas como named styles, cuerpo alternado con formato condicional.
+def register_cabify_styles(wb):
+    border_side = Side(style="thin", color=CABIFY["m2"])
+    border = Border(left=border_side, right=border_side, top=border_side, bottom=border_side)
+    wb.add_named_style(NamedStyle(
+        name="cabify_header",
+        fill=PatternFill("solid", fgColor=CABIFY["m4"]),
+        font=Font(color="FFFFFF", bold=True),
+        border=border,
+        alignment=Alignment(horizontal="center", vertical="center"),
+    ))
+    wb.add_named_style(NamedStyle(
+        name="cabify_fecha",
+        number_format="dd-mm-yyyy",
+        border=border,
+        alignment=Alignment(vertical="center"),
+    ))
+
+def style_ws_cabify(ws, n_rows, n_cols):
+    if n_cols < 1:
+        return
+    last_col = get_column_letter(n_cols)
+
+    # body (alternado) con formato condicional: un estilo por banda, no por celda
+    if n_rows >= 1:
+        border_side = Side(style="thin", color=CABIFY["m2"])
+        border = Border(left=border_side, right=border_side, top=border_side, bottom=border_side)
+        alt_fill = PatternFill("solid", bgColor=CABIFY["m10"])
+        base_fill = PatternFill("solid", bgColor=CABIFY["m11"])
+        body = f"A2:{last_col}{n_rows + 1}"
+        ws.conditional_formatting.add(body, FormulaRule(formula=["MOD(ROW(),2)=0"], fill=alt_fill, border=border))
+        ws.conditional_formatting.add(body, FormulaRule(formula=["MOD(ROW(),2)=1"], fill=base_fill, border=border))
+
+    # autofilter
+    ws.auto_filter.ref = f"A1:{last_col}{n_rows + 1}"
+
+def set_column_widths(ws, n_cols, width=18):
+    # ancho columnas (simple); en write-only debe ir antes de la primera fila
+    for col in range(1, n_cols + 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+def write_df_to_sheet(wb, name, df: pd.DataFrame, date_col="Fecha", on_rows=None, every=5000):
+    ws = wb.create_sheet(title=name[:31])
+    set_column_widths(ws, len(df.columns))
+
+    date_idx = list(df.columns).index(date_col) if date_col in df.columns else None
+    # NaN en columnas float -> celda vacía
+    nan_idx = [i for i, c in enumerate(df.columns)
+               if pd.api.types.is_float_dtype(df[c]) and df[c].isna().any()]
+    rows = dataframe_to_rows(df, index=False, header=True)
+
+    # header
+    header = []
+    for v in next(rows):
+        cell = WriteOnlyCell(ws, value=v)
+        cell.style = "cabify_header"
+        header.append(cell)
+    ws.append(header)
+
+    # body: valores planos, salvo la fecha (formato dd-mm-yyyy)
+    # on_rows(n): avance, llamado cada `every` filas escritas
+    for n, r in enumerate(rows, start=1):
+        for i in nan_idx:
+            if pd.isna(r[i]):
+                r[i] = None
+        if date_idx is not None:
+            cell = WriteOnlyCell(ws, value=r[date_idx])
+            cell.style = "cabify_fecha"
+            r[date_idx] = cell
+        ws.append(r)
+        if on_rows is not None and n % every == 0:
+            on_rows(every)
+    if on_rows is not None:
+        on_rows(len(df) % every)
+    return ws
+
+def ensure_list_sheet(wb):
+    if "Listas" in wb.sheetnames:
+        return wb["Listas"]
+    ws = wb.create_sheet("Listas")
+    ws.column_dimensions["A"].width = 30
+    ws.append(["Clasificación Manual"])
+    for opt in CLASIF_OPTS:
+        ws.append([opt])
+    return ws
+
+def apply_dropdown(ws, df_cols, target_col_name="Clasificación Manual"):
+    if target_col_name not in df_cols:
+        return
+    col_idx = list(df_cols).index(target_col_name) + 1
+    col_letter = get_column_letter(col_idx)
+
+    # Validación referenciando Listas!$A$2:$A$5 (sin header)
+    dv = DataValidation(type="list", formula1="=Listas!$A$2:$A$5", allow_blank=False)
+    dv.error = "Selecciona una opción válida"
+    dv.errorTitle = "Opción inválida"
+    dv.prompt = "Selecciona una opción"
+    dv.promptTitle = "Clasificación Manual"
+
+    dv.add(f"{col_letter}2:{col_letter}1048576")
+    ws.data_validations.append(dv)
+
+@timed("to_excel_bytes")
+def to_excel_bytes(dfs: dict, dropdown_sheet_name="Incidencias", progress=None):
+    """
+    progress(fraccion): opcional, avance 0..1 por filas escritas (para la UI).
+    """
+    output = BytesIO()
+    wb = Workbook(write_only=True)
+    register_cabify_styles(wb)
+
+    # sheet listas para dropdown
+    ws_list = ensure_list_sheet(wb)
+    ws_list.sheet_state = "hidden"  # oculto, pero existe para validación
+
+    total = max(sum(len(df) for df in dfs.values()), 1)
+    escritas = [0]
+
+    def avance(n):
+        escritas[0] += n
+        progress(min(escritas[0] / total, 1.0))
+
+    for name, df in dfs.items():
+        ws = write_df_to_sheet(wb, name, df, date_col="Fecha", on_rows=avance if progress is not None else None)
+
+        # Dropdown solo en hoja principal
+        if name == dropdown_sheet_name and "Clasificación Manual" in df.columns:
+            apply_dropdown(ws, df.columns, "Clasificación Manual")
+
+        style_ws_cabify(ws, len(df), len(df.columns))
+
+    wb.save(output)
+    output.seek(0)
+    return output
+
+# =========================
+# Etapas del pipeline
+# =========================
+@timed("normalizar")
+def normalizar(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as):
+    df_activos = df_activos.copy()
+    df_inasist = df_inasist.copy()
+    df_asist = df_asist.copy()
+
+    # RUT_norm (texto), RUT_key (clave entera de los joins) y RUT_problema (ver rut.py)
+    df_inasist[["RUT_norm", "RUT_key", "RUT_problema"]] = parse_ruts(df_inasist[rut_col_inas])
+    df_asist[["RUT_norm", "RUT_key", "RUT_problema"]] = parse_ruts(df_asist[rut_col_as])
+
+    # Fecha base (dates.py: formato detectado por columna, parseo por valor distinto)
+    dia_col_inas = find_col(df_inasist, ["Día", "Dia", "DIA", "día"])
+    df_inasist["Fecha_base"] = parse_dates(df_inasist[dia_col_inas]) if dia_col_inas else pd.NaT
+
+    fecha_ent_col_as = find_col(df_asist, ["Fecha Entrada", "Fecha_Entrada", "Fecha entrada"])
+    dia_col_as = find_col(df_asist, ["Día", "Dia", "DIA", "día"])
+    if fecha_ent_col_as:
+        df_asist["Fecha_base"] = parse_dates(df_asist[fecha_ent_col_as])
+    elif dia_col_as:
+        df_asist["Fecha_base"] = parse_dates(df_asist[dia_col_as])
+    else:
+        df_asist["Fecha_base"] = pd.NaT
+
+    # índice de fechas: ordenadas una vez por Fecha_base (NaT al final), el rango del
+    # selector es un corte por searchsorted (ver filter_by_range)
+    df_inasist = sort_by_date(df_inasist, "Fecha_base")
+    df_asist = sort_by_date(df_asist, "Fecha_base")
+
+    # Turnos planificados (reporte turnos) -> grilla colaboradores x días (sin melt)
+    # columnas fijas típicas (+ la de área, para poder filtrar)
+    fixed_cols_candidates = ["Nombre del Colaborador", "RUT", "Área", "Supervisor"]
+
+    # asegurar columna RUT
+    if "RUT" not in df_activos.columns:
+        rut_col_act = find_col(df_activos, ["RUT", "Rut", "rut"])
+        if rut_col_act:
+            df_activos = df_activos.rename(columns={rut_col_act: "RUT"})
+
+    area_col_act = find_col(df_activos, ["Área", "Area", "AREA"])
+    fixed_cols = [c for c in fixed_cols_candidates if c in df_activos.columns]
+    if area_col_act and area_col_act not in fixed_cols:
+        fixed_cols.append(area_col_act)
+    date_cols = [c for c in df_activos.columns if c not in fixed_cols]
+
+    # dimensión colaborador: RUT_key -> worker_id (int32 correlativo); fila i de la grilla
+    # = fila i de df_activos
+    df_activos = df_activos.reset_index(drop=True)
+    rut_act = df_activos["RUT"] if "RUT" in df_activos.columns else pd.Series(pd.NA, index=df_activos.index)
+    df_activos[["RUT_norm", "RUT_key", "RUT_problema"]] = parse_ruts(rut_act)
+    df_activos["worker_id"] = pd.factorize(df_activos["RUT_key"], sort=True)[0].astype("int32")
+
+    # fechas: los encabezados se parsean juntos; columnas que no son fecha no entran a la grilla
+    fechas = parse_dates(pd.Index(date_cols, dtype=object))
+    grilla = ShiftGrid.from_wide(df_activos, date_cols, fechas)
+
+    return df_activos, grilla, df_inasist, df_asist
+
+def ruts_con_problema(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as) -> pd.DataFrame:
+    """
+    RUTs vacíos, mal formados o con DV que no cuadra, por archivo (ver rut.py).
+    """
+    return reporte_ruts(
+        {"Reporte Turnos": df_activos, "Detalle · Inasistencias": df_inasist, "Detalle · Asistencias": df_asist},
+        {"Reporte Turnos": "RUT", "Detalle · Inasistencias": rut_col_inas, "Detalle · Asistencias": rut_col_as},
+    )
+
+def flags_planificado(valores) -> np.ndarray:
+    """
+    Un flag por valor distinto de la grilla: turno planificado (no vacío ni libre).
+    """
+    siglas = pd.Index(valores, dtype=object).astype(str).str.strip()
+    vacio = siglas.isin(["", "nan", "NaT", "None", "-", "—"])
+    # excluir libres (L) para planificación (tu regla)
+    libre = siglas.str.upper().isin(["L", "LIBRE"])
+    return ~(vacio | libre)
+
+@timed("filtrar_area")
+def filtrar_area(df_activos, grilla, df_inasist, df_asist, only_area_value, exacta=False):
+    df_activos = maybe_filter_area(df_activos, only_area_value, exacta)
+    if only_area_value:
+        grilla = grilla.take(filas=df_activos.index)
+    df_inasist = maybe_filter_area(df_inasist, only_area_value, exacta)
+    df_asist = maybe_filter_area(df_asist, only_area_value, exacta)
+
+    # límites para el selector de fechas
+    date_candidates = []
+    fechas_plan = grilla.fechas if grilla.shape[0] else grilla.fechas[:0]
+    for s in [pd.Series(fechas_plan), df_inasist["Fecha_base"], df_asist["Fecha_base"]]:
+        s_ok = s.dropna()
+        if len(s_ok):
+            date_candidates.append(s_ok.min())
+            date_candidates.append(s_ok.max())
+    bounds = (min(date_candidates), max(date_candidates)) if date_candidates else None
+
+    return df_activos, grilla, df_inasist, df_asist, bounds
+
+def sort_by_date(df, col):
+    df[col] = df[col].astype("datetime64[ns]")
+    return df.sort_values(col, kind="stable", na_position="last")
+
+def filter_by_range(df, col, desde, hasta):
+    """
+    Filas con col entre desde y hasta (días, inclusive). df viene ordenado por col
+    (sort_by_date), así que es un corte O(log n) que devuelve una vista, sin copiar.
+    """
+    if col not in df.columns:
+        return df
+    s = df[col].to_numpy(dtype="datetime64[ns]")
+    ini = s.searchsorted(pd.Timestamp(desde).to_datetime64(), side="left")
+    fin = s.searchsorted((pd.Timestamp(hasta) + pd.Timedelta(days=1)).to_datetime64(), side="left")
+    return df.iloc[ini:fin]
+
+@timed("filtrar_rango")
+def filtrar_rango(df_activos, grilla, df_inasist, df_asist, desde, hasta):
+    df_inasist = filter_by_range(df_inasist, "Fecha_base", desde, hasta)
+    df_asist = filter_by_range(df_asist, "Fecha_base", desde, hasta)
+
+    # (1) Filtrar colaboradores: SOLO los que existan en Detalle Turnos Colaboradores
+    # (las filas de Detalle quedan todas: son las que definen el universo)
+    valid_keys = np.union1d(df_inasist["RUT_key"].to_numpy(), df_asist["RUT_key"].to_numpy())
+    valid_keys = valid_keys[valid_keys >= 0]
+    activos_valid = df_activos[df_activos["RUT_key"].isin(valid_keys)]
+    grilla = grilla.take(filas=activos_valid.index, desde=desde, hasta=hasta)
+
+    # base de planificación (no depende de la clasificación manual)
+    plan = grilla.mask(flags_planificado(grilla.valores))
+
+    # turnos planificados por colaborador (suma por fila, acumulada por worker_id)
+    worker_ids = df_activos.loc[grilla.filas, "worker_id"].to_numpy()
+    por_worker = np.bincount(worker_ids, weights=plan.sum(axis=1), minlength=len(df_activos)).astype("int64")
+    con_turnos = np.flatnonzero(por_worker)
+    dim = activos_valid.drop_duplicates("worker_id").set_index("worker_id").reindex(con_turnos)
+    turnos_plan = pd.DataFrame({
+        "worker_id": con_turnos.astype("int32"),
+        "RUT_key": dim["RUT_key"].to_numpy(),
+        "RUT_norm": dim["RUT_norm"].to_numpy(),
+        "Turnos_planificados": por_worker[con_turnos],
+    }).sort_values("RUT_norm", kind="stable").reset_index(drop=True)
+    # turnos planificados diarios (sin libres): suma por columna
+    tp_day = pd.Series(plan.sum(axis=0), index=grilla.fechas.date)
+
+    # nombres: preferir reporte turnos (Nombre del Colaborador)
+    base_names = None
+    name_col = find_col(df_activos, ["Nombre del Colaborador", "Nombre", "Colaborador"])
+    if name_col:
+        base_names = activos_valid.drop_duplicates("worker_id")[["worker_id", "RUT_norm", name_col]].copy()
+        base_names[["Nombre", "Primer Apellido", "Segundo Apellido"]] = base_names[name_col].apply(
+            lambda x: pd.Series(split_fullname(x))
+        )
+
+    return df_inasist, df_asist, turnos_plan, tp_day, base_names
+
+@timed("construir_incidencias")
+def construir_incidencias(df_inasist, df_asist, rut_col_inas, rut_col_as, min_inc_h):
+    inc_rows = []
+
+    # Asistencias: retraso / salida anticipada (con umbral)
+    retr = get_num(df_asist, ["Retraso (horas)", "Retraso horas", "Retraso"])
+    sal = get_num(df_asist, ["Salida Anticipada (horas)", "Salida Anticipada", "Salida anticipada (horas)"])
+    total_rs = retr + sal
+    umbral = float(min_inc_h)
+
+    mask_asist = (retr >= umbral) | (sal >= umbral) | (total_rs >= umbral)
+    df_asist_inc = df_asist[mask_asist].copy()
+
+    df_asist_inc["Fecha"] = df_asist_inc["Fecha_base"].dt.date
+    df_asist_inc["Nombre"] = safe_text_series(df_asist_inc, ["Nombre"], "")
+    df_asist_inc["Primer Apellido"] = safe_text_series(df_asist_inc, ["Primer Apellido", "Primer apellido"], "")
+    df_asist_inc["Segundo Apellido"] = safe_text_series(df_asist_inc, ["Segundo Apellido", "Segundo apellido"], "")
+    df_asist_inc["RUT"] = df_asist_inc[rut_col_as].astype(str)
+    df_asist_inc["Turno"] = safe_text_series(df_asist_inc, ["Turno"], "")
+    df_asist_inc["Especialidad"] = safe_text_series(df_asist_inc, ["Especialidad"], "")
+    df_asist_inc["Supervisor"] = safe_text_series(df_asist_inc, ["Supervisor"], "")
+
+    df_asist_inc["Tipo_Incidencia"] = "Marcaje/Turno"
+    df_asist_inc["Detalle"] = (
+        "Retraso_h=" + retr[mask_asist].astype(str).values
+        + " | SalidaAnt_h=" + sal[mask_asist].astype(str).values
+        + " | Total_h=" + total_rs[mask_asist].astype(str).values
+    )
+    df_asist_inc["Clasificación Manual"] = "Seleccionar"
+
+    inc_rows.append(df_asist_inc[[
+        "Fecha", "Nombre", "Primer Apellido", "Segundo Apellido", "RUT",
+        "Turno", "Especialidad", "Supervisor",
+        "Tipo_Incidencia", "Detalle", "Clasificación Manual"
+    ]])
+
+    # Inasistencias: se listan completas (del rango) para clasificar
+    df_inasist_inc = df_inasist.copy()
+    df_inasist_inc["Fecha"] = df_inasist_inc["Fecha_base"].dt.date
+    df_inasist_inc["Nombre"] = safe_text_series(df_inasist_inc, ["Nombre"], "")
+    df_inasist_inc["Primer Apellido"] = safe_text_series(df_inasist_inc, ["Primer Apellido", "Primer apellido"], "")
+    df_inasist_inc["Segundo Apellido"] = safe_text_series(df_inasist_inc, ["Segundo Apellido", "Segundo apellido"], "")
+    df_inasist_inc["RUT"] = df_inasist_inc[rut_col_inas].astype(str)
+    df_inasist_inc["Turno"] = safe_text_series(df_inasist_inc, ["Turno"], "")
+    df_inasist_inc["Especialidad"] = safe_text_series(df_inasist_inc, ["Especialidad"], "")
+    df_inasist_inc["Supervisor"] = safe_text_series(df_inasist_inc, ["Supervisor"], "")
+
+    mot = safe_text_series(df_inasist_inc, ["Motivo"], "")
+    df_inasist_inc["Tipo_Incidencia"] = "Inasistencia"
+    df_inasist_inc["Detalle"] = "Motivo=" + mot
+    df_inasist_inc["Clasificación Manual"] = "Seleccionar"
+
+    inc_rows.append(df_inasist_inc[[
+        "Fecha", "Nombre", "Primer Apellido", "Segundo Apellido", "RUT",
+        "Turno", "Especialidad", "Supervisor",
+        "Tipo_Incidencia", "Detalle", "Clasificación Manual"
+    ]])
+
+    df_incidencias = pd.concat(inc_rows, ignore_index=True)
+
+    # Orden y fecha
+    df_incidencias["Fecha"] = pd.to_datetime(df_incidencias["Fecha"], errors="coerce")
+    df_incidencias = df_incidencias.sort_values(["Fecha", "RUT"], na_position="last").reset_index(drop=True)
+    return df_incidencias
+
+# Agregados mantenidos: conteos por (clasificación, tipo), injustificadas por colaborador
+# y por día. Cada edición de la tabla se compara con la anterior y solo las filas que
+# cambiaron (o que se agregaron / borraron) entran como deltas -1 / +1 a los conteos.
+CLAVES_AGREGADOS = ["Clasificación Manual", "Tipo_Incidencia", "RUT", "Fecha"]
+
+def _sin_nulo(v):
+    return None if pd.isna(v) else v
+
+class AgregadosIncrementales:
+    def __init__(self, turnos_plan, tp_day, base_names, desde, hasta, rollups=()):
+        self.turnos_plan = turnos_plan
+        self.tp_day = tp_day
+        self.base_names = base_names
+        self.desde, self.hasta, self.rollups = desde, hasta, tuple(rollups)
+        self._pos_rut = pd.Index(turnos_plan["RUT_key"])
+        self.prev = None                                    # filas clave de la última tabla
+        self.por_tipo = {}                                  # (clasificación, tipo) -> cantidad
+        self.inj_rut = np.zeros(len(turnos_plan), dtype="int64")  # alineado con turnos_plan
+        self.inj_dia = {}                                   # date -> injustificadas
+        self.nombres = {}                                   # RUT_key -> nombres (si no hay base_names)
+
+    def _aplicar(self, filas, signo):
+        if not len(filas):
+            return
+        g = filas.groupby(["Clasificación Manual", "Tipo_Incidencia"], dropna=False).size()
+        for (clasif, tipo), n in g.items():
+            k = (_sin_nulo(clasif), _sin_nulo(tipo))
+            self.por_tipo[k] = self.por_tipo.get(k, 0) + signo * int(n)
+
+        inj = filas[filas["Clasificación Manual"] == "Injustificada"]
+        if len(inj):
+            keys = parse_ruts(inj["RUT"])["RUT_key"].to_numpy()
+            pos = self._pos_rut.get_indexer(keys[keys >= 0])
+            np.add.at(self.inj_rut, pos[pos >= 0], signo)
+            for dia, n in pd.to_datetime(inj["Fecha"], errors="coerce").dt.date.value_counts().items():
+                self.inj_dia[dia] = self.inj_dia.get(dia, 0) + signo * int(n)
+
+    def _agregar_nombres(self, edited, idx):
+        # sin Reporte Turnos con nombres: primer nombre visto por RUT en la tabla
+        name_cols = ["Nombre", "Primer Apellido", "Segundo Apellido"]
+        if self.base_names is not None or not len(idx) or not set(name_cols) <= set(edited.columns):
+            return
+        filas = edited.loc[idx, name_cols].assign(RUT_key=parse_ruts(edited.loc[idx, "RUT"])["RUT_key"])
+        for key, fila in filas[filas["RUT_key"] >= 0].drop_duplicates("RUT_key").set_index("RUT_key").iterrows():
+            self.nombres.setdefault(key, fila.tolist())
+
+    def actualizar(self, edited):
+        """
+        Aplica la tabla editada como deltas respecto de la anterior (por índice de fila).
+        """
+        cur = edited.reindex(columns=CLAVES_AGREGADOS)
+        if self.prev is None:
+            quitar, poner = cur.index[:0], cur.index
+        else:
+            comunes = self.prev.index.intersection(cur.index)
+            a, b = self.prev.loc[comunes], cur.loc[comunes]
+            distinto = ~((a == b) | (a.isna() & b.isna())).all(axis=1)
+            cambiadas = comunes[distinto.to_numpy()]
+            quitar = cambiadas.append(self.prev.index.difference(cur.index))
+            poner = cambiadas.append(cur.index.difference(self.prev.index))
+            self._aplicar(self.prev.loc[quitar], -1)
+        self._aplicar(cur.loc[poner], +1)
+        self._agregar_nombres(edited, poner)
+        self.prev = cur.copy()
+        return len(quitar), len(poner)
+
+    def resumen(self) -> pd.DataFrame:
+        filas = [(c, t, n) for (c, t), n in self.por_tipo.items() if n > 0]
+        return (
+            pd.DataFrame(filas, columns=["Clasificación Manual", "Tipo_Incidencia", "Cantidad"])
+            .sort_values(["Clasificación Manual", "Tipo_Incidencia"], na_position="last")
+            .sort_values("Cantidad", ascending=False, kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def cumplimiento(self) -> pd.DataFrame:
+        cumpl = self.turnos_plan.copy()
+        cumpl["Injustificadas"] = self.inj_rut.copy()
+
+        name_cols = ["Nombre", "Primer Apellido", "Segundo Apellido"]
+        if self.base_names is None:
+            nombres = pd.DataFrame.from_dict(self.nombres, orient="index", columns=name_cols)
+            nombres = nombres.rename_axis("RUT_key").reset_index().astype({"RUT_key": "int64"})
+            cumpl = cumpl.merge(nombres, on="RUT_key", how="left")
+        else:
+            cumpl = cumpl.merge(self.base_names[["worker_id"] + name_cols], on="worker_id", how="left")
+
+        # cumplimiento %
+        cumpl["Cumplimiento_%"] = (1 - (cumpl["Injustificadas"] / cumpl["Turnos_planificados"].replace({0: pd.NA}))) * 100
+        cumpl["Cumplimiento_%"] = cumpl["Cumplimiento_%"].round(2)
+
+        return cumpl[[
+            "Nombre", "Primer Apellido", "Segundo Apellido",
+            "RUT_norm", "Turnos_planificados", "Injustificadas", "Cumplimiento_%"
+        ]].rename(columns={"RUT_norm": "RUT_norm_sin_puntos"}).sort_values(["Cumplimiento_%", "Injustificadas"], ascending=[True, False])
+
+    def kpis(self) -> pd.DataFrame:
+        inj_day = pd.Series({d: n for d, n in self.inj_dia.items() if n > 0}, dtype="int64")
+        return kpi_matrix(self.tp_day, inj_day, self.desde, self.hasta, rollups=self.rollups)
+
+    def resultados(self):
+        return self.resumen(), self.cumplimiento(), self.kpis()
+
+@timed("construir_agregados")
+def construir_agregados(edited, turnos_plan, tp_day, base_names, desde, hasta, rollups=()):
+    """
+    Resumen, cumplimiento y matriz KPI desde cero (una sola pasada de AgregadosIncrementales).
+    """
+    agg = AgregadosIncrementales(turnos_plan, tp_day, base_names, desde, hasta, rollups)
+    agg.actualizar(edited)
+    return agg.resultados()
+
+@timed("actualizar_agregados")
+def actualizar_agregados(agg, edited):
+    agg.actualizar(edited)
+    return agg.resultados()
+
+KPI_ROLLUPS = {"semana": "Semana ISO", "mes": "Mes"}
+
+def _kpi_frame(tp, ij) -> pd.DataFrame:
+    tp = tp.astype("int64")
+    ij = ij.astype("int64")
+    cumpl = ((1 - ij / tp.where(tp > 0)) * 100).round(2)
+    return pd.DataFrame({"Turnos_planificados": tp, "Injustificadas": ij, "Cumplimiento_%": cumpl})
+
+def kpi_matrix(tp_day, inj_day, desde, hasta, rollups=()) -> pd.DataFrame:
+    """
+    Matriz KPI (filas) x fecha (columnas DD-MM-AAAA), armada en un solo paso.
+    rollups: "semana" (ISO) y/o "mes" agregan columnas con los totales del periodo.
+    Cumplimiento_% queda vacío (NaN) si no hay turnos planificados.
+    """
+    # Fechas del periodo (día a día)
+    all_days = pd.date_range(pd.to_datetime(desde), pd.to_datetime(hasta), freq="D")
+    dias = all_days.date
+
+    tp = pd.Series(tp_day, dtype="float64").reindex(dias, fill_value=0).set_axis(all_days)
+    ij = pd.Series(inj_day, dtype="float64").reindex(dias, fill_value=0).set_axis(all_days)
+    daily = _kpi_frame(tp, ij)
+
+    parts = [daily.set_axis(all_days.strftime("%d-%m-%Y"))]
+    if "semana" in rollups:
+        iso = all_days.isocalendar()
+        key = "Sem " + iso["year"].astype(str).to_numpy() + "-W" + iso["week"].map("{:02d}".format).to_numpy()
+        g = daily[["Turnos_planificados", "Injustificadas"]].groupby(key, sort=False).sum()
+        parts.append(_kpi_frame(g["Turnos_planificados"], g["Injustificadas"]))
+    if "mes" in rollups:
+        key = all_days.strftime("Mes %Y-%m")
+        g = daily[["Turnos_planificados", "Injustificadas"]].groupby(key, sort=False).sum()
+        parts.append(_kpi_frame(g["Turnos_planificados"], g["Injustificadas"]))
+
+    mat = pd.concat(parts).T
+    mat.index.name = "KPI"
+    return mat.reset_index()
+
+# =========================
+# Pipeline completo (sin UI)
+# =========================
+def detect_rut_cols(df_inasist, df_asist):
+    rut_col_inas = find_col(df_inasist, ["RUT", "Rut", "rut"])
+    rut_col_as = find_col(df_asist, ["RUT", "Rut", "rut"])
+    if not rut_col_inas or not rut_col_as:
+        raise ValueError("No pude detectar la columna RUT en una de las hojas del Detalle Turnos Colaboradores.")
+    return rut_col_inas, rut_col_as
+
+def run_pipeline(df_activos, df_inasist, df_asist, only_area=None, desde=None, hasta=None, min_inc_h=0.0,
+                 normalizado=None, rollups=(), area_exacta=False) -> dict:
+    """
+    Corre todas las etapas y devuelve las hojas del reporte consolidado
+    (Incidencias, Resumen, Cumplimiento, KPIs_Diarios y RUTs_Invalidos si hay), sin clasificación manual.
+    desde/hasta: por defecto, el rango completo de fechas del área.
+    normalizado: salida de normalizar() ya calculada (para no repetirla por área).
+    rollups: columnas extra de la matriz KPI ("semana", "mes").
+    area_exacta: only_area es el nombre exacto del área (no texto contenido).
+    """
+    rut_col_inas, rut_col_as = detect_rut_cols(df_inasist, df_asist)
+    if normalizado is None:
+        normalizado = normalizar(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as)
+
+    df_activos, grilla, df_inasist, df_asist, bounds = filtrar_area(*normalizado, only_area, area_exacta)
+    if bounds is None:
+        raise ValueError("No pude detectar fechas válidas en los archivos.")
+    desde = desde or bounds[0].date()
+    hasta = hasta or bounds[1].date()
+
+    df_inasist, df_asist, turnos_plan, tp_day, base_names = filtrar_rango(
+        df_activos, grilla, df_inasist, df_asist, desde, hasta
+    )
+    df_incidencias = construir_incidencias(df_inasist, df_asist, rut_col_inas, rut_col_as, min_inc_h)
+    resumen, cumpl, mat = construir_agregados(df_incidencias, turnos_plan, tp_day, base_names, desde, hasta, rollups)
+
+    sheets = {
+        "Incidencias": df_incidencias,
+        "Resumen": resumen,
+        "Cumplimiento": cumpl,
+        "KPIs_Diarios": mat,
+    }
+    df_ruts = ruts_con_problema(df_activos, df_inasist, df_asist, rut_col_inas, rut_col_as)
+    if len(df_ruts):
+        sheets["RUTs_Invalidos"] = df_ruts
+    return sheets
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# =========================
+# RUT: normalización vectorizada + dígito verificador + clave entera
+# =========================
+# Se trabaja sobre los valores distintos (factorize) y se reparte a todas las filas.
+# RUT_key = cuerpo numérico (sin DV) como int64: es la clave de todos los joins; -1 si el
+# RUT no tiene forma de RUT. Un DV que no cuadra no cambia la clave, pero se reporta.
+_RUT_RE = r"^0*(\d{1,9})-?([0-9K])$"
+_PESOS = np.array([2, 3, 4, 5, 6, 7, 2, 3, 4], dtype="int64")
+
+PROBLEMA_VACIO = "Vacío"
+PROBLEMA_FORMATO = "Formato inválido"
+PROBLEMA_DV = "DV no coincide"
+
+def dv_esperado(cuerpos) -> np.ndarray:
+    """
+    Dígito verificador (módulo 11) para un array de cuerpos numéricos.
+    """
+    n = np.asarray(cuerpos, dtype="int64").copy()
+    s = np.zeros(len(n), dtype="int64")
+    for peso in _PESOS:
+        s += (n % 10) * peso
+        n //= 10
+    dv = 11 - s % 11
+    return np.where(dv == 11, "0", np.where(dv == 10, "K", dv.astype(str)))
+
+def parse_ruts(values) -> pd.DataFrame:
+    """
+    Una fila por valor de entrada (mismo índice):
+    - RUT_norm: sin puntos ni espacios, en mayúsculas ("" si viene vacío)
+    - RUT_key: cuerpo como int64 (-1 si vacío o sin forma de RUT)
+    - RUT_problema: "" si está OK; si no, vacío / formato / DV
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+
+    norm = (
+        pd.Series(uniques, dtype=object).astype(str)
+        .str.strip().str.upper()
+        .str.replace(".", "", regex=False).str.replace(" ", "", regex=False)
+    )
+    partes = norm.str.extract(_RUT_RE)
+    ok_formato = partes[0].notna().to_numpy()
+    cuerpo = pd.to_numeric(partes[0], errors="coerce").fillna(-1).astype("int64").to_numpy()
+    dv = partes[1].fillna("").to_numpy(dtype=object)
+    esperado = dv_esperado(np.where(ok_formato, cuerpo, 0))
+    dv_ok = dv == esperado
+
+    problema = np.select(
+        [norm.to_numpy(dtype=object) == "", ~ok_formato, ~dv_ok],
+        [PROBLEMA_VACIO, PROBLEMA_FORMATO, PROBLEMA_DV + " (esperado " + esperado.astype(object) + ")"],
+        default="",
+    )
+
+    # el último elemento cubre los nulos (código -1 de factorize)
+    norm = np.append(norm.to_numpy(dtype=object), "")
+    key = np.append(np.where(ok_formato, cuerpo, -1), -1)
+    problema = np.append(problema.astype(object), PROBLEMA_VACIO)
+    return pd.DataFrame({
+        "RUT_norm": norm[codes],
+        "RUT_key": key[codes],
+        "RUT_problema": problema[codes],
+    }, index=values.index)
+
+def reporte_ruts(fuentes: dict, rut_cols: dict) -> pd.DataFrame:
+    """
+    RUTs con problema (formato / DV / vacío), por archivo de origen.
+    fuentes: {"origen": df con RUT_problema}; rut_cols: {"origen": columna RUT original}.
+    """
+    partes = []
+    for origen, df in fuentes.items():
+        if "RUT_problema" not in df.columns:
+            continue
+        malos = df[df["RUT_problema"] != ""]
+        if not len(malos):
+            continue
+        rut = malos[rut_cols[origen]].astype(str) if rut_cols.get(origen) in malos.columns else malos["RUT_norm"]
+        g = (
+            pd.DataFrame({"RUT": rut.to_numpy(), "Problema": malos["RUT_problema"].to_numpy()})
+            .groupby(["RUT", "Problema"], dropna=False)
+            .size()
+            .reset_index(name="Filas")
+        )
+        g.insert(0, "Origen", origen)
+        partes.append(g)
+    if not partes:
+        return pd.DataFrame(columns=["Origen", "RUT", "Problema", "Filas"])
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,85 @@
+import hashlib
+
+import pandas as pd
+
+# =========================
+# Esquema declarativo de las hojas de entrada
+# =========================
+# Cada hoja se describe como una lista de campos (nombre canónico, alias aceptados, dtype).
+# El esquema se resuelve una vez contra el encabezado de la hoja: solo se leen las columnas
+# que calzan, quedan con el nombre canónico y con su tipo (texto repetido -> category,
+# horas -> float64). Las hojas sin esquema (grilla de turnos) se leen completas.
+class Campo:
+    def __init__(self, nombre, alias=(), dtype="object"):
+        self.nombre = nombre
+        self.alias = tuple(alias)
+        self.dtype = dtype
+
+    def candidatos(self):
+        return (self.nombre,) + self.alias
+
+    def __repr__(self):
+        return f"Campo({self.nombre!r}, {self.alias!r}, {self.dtype!r})"
+
+_COMUNES = [
+    Campo("RUT", ["Rut", "rut"]),
+    Campo("Día", ["Dia", "DIA", "día"]),
+    Campo("Nombre"),
+    Campo("Primer Apellido", ["Primer apellido"]),
+    Campo("Segundo Apellido", ["Segundo apellido"]),
+    Campo("Turno", dtype="category"),
+    Campo("Especialidad", dtype="category"),
+    Campo("Supervisor", dtype="category"),
+    Campo("Área", ["Area", "AREA"], dtype="category"),
+]
+
+INASISTENCIAS = _COMUNES + [
+    Campo("Motivo", dtype="category"),
+]
+
+ASISTENCIAS = _COMUNES + [
+    Campo("Fecha Entrada", ["Fecha_Entrada", "Fecha entrada"]),
+    Campo("Hora Entrada", ["Hora_Entrada", "Hora entrada"]),
+    Campo("Hora Salida", ["Hora_Salida", "Hora salida"]),
+    Campo("Retraso (horas)", ["Retraso horas", "Retraso"], dtype="float64"),
+    Campo("Salida Anticipada (horas)", ["Salida Anticipada", "Salida anticipada (horas)"], dtype="float64"),
+]
+
+SCHEMAS = {"inasistencias": INASISTENCIAS, "asistencias": ASISTENCIAS}
+
+def schema_key(name) -> str:
+    """
+    Nombre + huella de los campos: cambiar el esquema invalida lo cacheado con el anterior.
+    """
+    return f"{name}-{hashlib.sha1(repr(SCHEMAS[name]).encode()).hexdigest()[:8]}"
+
+def resolve(columns, campos) -> dict:
+    """
+    {nombre canónico: columna real} para los campos presentes (sin mayúsculas ni espacios
+    extremos; gana el primer candidato que calce). Los campos que faltan no aparecen.
+    """
+    norm_map = {}
+    for c in columns:
+        norm_map.setdefault(str(c).strip().lower(), c)
+    mapa = {}
+    for campo in campos:
+        for cand in campo.candidatos():
+            real = norm_map.get(cand.strip().lower())
+            if real is not None and real not in mapa.values():
+                mapa[campo.nombre] = real
+                break
+    return mapa
+
+def apply_dtypes(df: pd.DataFrame, campos) -> pd.DataFrame:
+    for campo in campos:
+        if campo.nombre not in df.columns or campo.dtype == "object":
+            continue
+        if campo.dtype == "float64":
+            col = df[campo.nombre]
+            if not pd.api.types.is_numeric_dtype(col):
+                # texto con coma decimal (exportes es-CL: "0,25")
+                col = col.where(col.isna(), col.astype(str).str.strip().str.replace(",", ".", regex=False))
+            df[campo.nombre] = pd.to_numeric(col, errors="coerce")
+        else:
+            df[campo.nombre] = df[campo.nombre].astype(campo.dtype)
+    return df
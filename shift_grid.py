@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# =========================
+# Grilla de turnos (trabajadores x días) sin melt
+# =========================
+# La hoja "Activos + Turnos" viene ancha: una fila por colaborador y una columna por día.
+# En vez de pasarla a formato largo se guarda como matriz de códigos (índices a `valores`,
+# -1 = celda vacía). Turnos por colaborador / por día son sumas por eje; la primera fecha
+# activa es un argmax. Solo se arman filas largas para las celdas que se necesitan.
+
+class ShiftGrid:
+    def __init__(self, codes, valores, fechas, filas):
+        self.codes = codes        # int16/int32 (n_filas x n_dias), -1 = vacío
+        self.valores = valores    # valores distintos de las celdas (tal cual vienen)
+        self.fechas = fechas      # DatetimeIndex ordenado, una por columna
+        self.filas = filas        # índice (label) de la fila en la hoja ancha
+
+    @classmethod
+    def from_wide(cls, df: pd.DataFrame, date_cols, fechas) -> "ShiftGrid":
+        """
+        date_cols: columnas día de df; fechas: su fecha (NaT = se descarta la columna).
+        Varias columnas con la misma fecha (p. ej. "03-03-2025" y 2025-03-03 de dos archivos)
+        se juntan en una: por fila gana la primera celda no vacía, en el orden de las columnas.
+        """
+        fechas = pd.DatetimeIndex(fechas)
+        ok = ~fechas.isna()
+        date_cols = [c for c, keep in zip(date_cols, ok) if keep]
+        fechas = fechas[ok].normalize()
+        orden = np.argsort(fechas.to_numpy(), kind="stable")
+
+        codes, valores = pd.factorize(df[date_cols].to_numpy(dtype=object).ravel())
+        dtype = "int16" if len(valores) < np.iinfo("int16").max else "int32"
+        codes = codes.astype(dtype).reshape(len(df), len(date_cols))[:, orden]
+        fechas = fechas[orden]
+
+        # fechas repetidas: inicio y tamaño de cada grupo (ya ordenado, estable)
+        _, inicio, tam = np.unique(fechas.to_numpy(), return_index=True, return_counts=True)
+        if len(inicio) < len(fechas):
+            out = codes[:, inicio]
+            for k in range(1, tam.max()):
+                grupos = np.nonzero(tam > k)[0]
+                sig = codes[:, inicio[grupos] + k]
+                vacio = out[:, grupos] == -1
+                out[:, grupos] = np.where(vacio, sig, out[:, grupos])
+            codes, fechas = out, fechas[inicio]
+        return cls(codes, np.asarray(valores, dtype=object), fechas, df.index.to_numpy())
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    def take(self, filas=None, desde=None, hasta=None) -> "ShiftGrid":
+        """
+        Subgrilla: filas por label (las que no están se ignoran) y/o rango de fechas (inclusive).
+        """
+        rows = slice(None)
+        filas_out = self.filas
+        if filas is not None:
+            rows = pd.Index(self.filas).get_indexer(np.asarray(filas))
+            rows = rows[rows >= 0]
+            filas_out = self.filas[rows]
+        ini = 0 if desde is None else self.fechas.searchsorted(pd.Timestamp(desde), side="left")
+        fin = len(self.fechas) if hasta is None else self.fechas.searchsorted(pd.Timestamp(hasta), side="right")
+        return ShiftGrid(self.codes[rows, ini:fin], self.valores, self.fechas[ini:fin], filas_out)
+
+    def mask(self, flags) -> np.ndarray:
+        """
+        Matriz bool a partir de un flag por valor distinto (las celdas vacías quedan en False).
+        """
+        # el último elemento cubre las celdas vacías (código -1)
+        return np.append(np.asarray(flags, dtype=bool), False)[self.codes]
+
+    def first_active(self, mask) -> np.ndarray:
+        """
+        Posición (columna) del primer día activo por fila; -1 si la fila no tiene ninguno.
+        """
+        return np.where(mask.any(axis=1), mask.argmax(axis=1), -1)
+
+    def long(self, mask):
+        """
+        (posición fila, posición día) de las celdas en True, día por día (el orden del melt).
+        """
+        dias, rows = np.nonzero(mask.T)
+        return rows, dias
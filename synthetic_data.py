@@ -0,0 +1,179 @@
+"""
+Generador de datos sintéticos con la forma de los archivos reales:
+- "Codificación Turnos BUK" (Sigla, Horario, Tipo, Jornada)
+- "Activos + Turnos" (ancho: Nombre del Colaborador, RUT, Área, Supervisor + columnas DD-MM-AAAA)
+- "Detalle Turnos Colaboradores" (Hoja1=Inasistencias, Hoja2=Asistencias)
+
+    python synthetic_data.py --workers 500 --days 31 --out datos_sinteticos/
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SHIFTS = pd.DataFrame({
+    "Sigla": ["M", "T", "N", "M6", "T6", "L"],
+    "Horario": ["07:00-15:00", "15:00-23:00", "23:00-07:00", "06:00-14:00", "14:00-22:00", "Libre"],
+    "Tipo": ["Diurno", "Diurno", "Nocturno", "Diurno", "Diurno", "Libre"],
+    "Jornada": [8, 8, 8, 8, 8, 0],
+})
+_START_MIN = {"M": 420, "T": 900, "N": 1380, "M6": 360, "T6": 840}
+_DAY_SHIFTS = ["M", "T", "M6", "T6"]
+
+AREAS = ["AEROPUERTO SCL", "AEROPUERTO PMC", "AEROPUERTO CCP", "OFICINA CENTRAL"]
+SUPERVISORES = ["Ana Rojas", "Luis Soto", "Marta Díaz", "Pedro Vera", "Carla Muñoz"]
+ESPECIALIDADES = ["Rampa", "Counter", "Bodega", "Supervisión"]
+NOMBRES = ["Juan", "María", "José", "Camila", "Diego", "Valentina", "Felipe", "Constanza"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva", "Martínez"]
+MOTIVOS = ["Falta", "Licencia", "Atraso mayor", "Sin aviso"]
+
+def rut_with_dv(n: int) -> str:
+    # RUT chileno con dígito verificador (módulo 11) y puntos: 12.345.678-5
+    s, m = 0, 2
+    for d in reversed(str(n)):
+        s += int(d) * m
+        m = 2 if m == 7 else m + 1
+    dv = 11 - s % 11
+    dv = "0" if dv == 11 else "K" if dv == 10 else str(dv)
+    return f"{n:,}".replace(",", ".") + "-" + dv
+
+def _hhmmss(minutes) -> np.ndarray:
+    m = np.mod(np.asarray(minutes, dtype="int64"), 24 * 60)
+    return np.char.add(np.char.add(np.char.zfill((m // 60).astype(str), 2), ":"),
+                       np.char.add(np.char.zfill((m % 60).astype(str), 2), ":00"))
+
+def generate(workers=200, days=31, start="2025-03-01", punch_noise=0.1, overnight_share=0.2,
+             absence_rate=0.05, free_share=0.25, seed=0) -> dict:
+    """
+    Devuelve {"turnos", "activos", "inasistencias", "asistencias"} como DataFrames,
+    con los tipos que entrega pd.read_excel sobre los archivos reales.
+    punch_noise: probabilidad de marcaje duplicado / faltante y escala del desvío horario.
+    overnight_share: fracción de turnos planificados que son nocturnos (cruzan medianoche).
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq="D")
+    labels = dates.strftime("%d-%m-%Y")
+
+    ruts = np.array([rut_with_dv(10_000_000 + 7919 * i) for i in range(workers)])
+    nombres = rng.choice(NOMBRES, workers)
+    ap1 = rng.choice(APELLIDOS, workers)
+    ap2 = rng.choice(APELLIDOS, workers)
+    areas = rng.choice(AREAS, workers, p=[0.5, 0.2, 0.2, 0.1])
+    supervisores = rng.choice(SUPERVISORES, workers)
+    especialidades = rng.choice(ESPECIALIDADES, workers)
+
+    # grilla de turnos (trabajadores x días)
+    grid = rng.choice(_DAY_SHIFTS, (workers, days))
+    grid = np.where(rng.random((workers, days)) < overnight_share, "N", grid)
+    grid = np.where(rng.random((workers, days)) < free_share, "L", grid)
+    # algunos ingresan a mitad de periodo (celdas vacías al inicio)
+    ingreso = np.where(rng.random(workers) < 0.1, rng.integers(0, max(days // 2, 1), workers), 0)
+    grid = np.where(np.arange(days)[None, :] < ingreso[:, None], "", grid)
+
+    activos = pd.DataFrame({
+        "Nombre del Colaborador": np.char.add(np.char.add(np.char.add(nombres, " "), np.char.add(ap1, " ")), ap2),
+        "RUT": ruts,
+        "Área": areas,
+        "Supervisor": supervisores,
+    })
+    # celdas vacías como NaN, igual que al leer el Excel
+    activos = pd.concat([activos, pd.DataFrame(grid, columns=labels).replace("", np.nan)], axis=1)
+
+    # turnos trabajables en formato largo
+    w_idx, d_idx = np.nonzero(~np.isin(grid, ["", "L"]))
+    sig = grid[w_idx, d_idx]
+    fecha = dates.values[d_idx]
+    ausente = rng.random(len(w_idx)) < absence_rate
+
+    def meta(idx):
+        return {"Nombre": nombres[idx], "Primer Apellido": ap1[idx], "Segundo Apellido": ap2[idx]}
+
+    def tail(idx):
+        return {"Especialidad": especialidades[idx], "Supervisor": supervisores[idx], "Área": areas[idx]}
+
+    a = ausente
+    inasistencias = pd.DataFrame({
+        "RUT": ruts[w_idx[a]],
+        "Día": pd.DatetimeIndex(fecha[a]).strftime("%d-%m-%Y"),
+        **meta(w_idx[a]),
+        "Turno": sig[a],
+        **tail(w_idx[a]),
+        "Motivo": rng.choice(MOTIVOS, a.sum()),
+    })
+
+    # asistencias: desvío de entrada/salida, algunos duplicados y marcajes faltantes
+    p = ~ausente
+    dup = rng.random(p.sum()) < punch_noise / 2
+    idx = np.concatenate([np.nonzero(p)[0], np.nonzero(p)[0][dup]])
+    n = len(idx)
+    start_min = np.array([_START_MIN[s] for s in sig[idx]])
+    desvio = max(punch_noise, 0.01) * 60
+    ent = start_min + rng.normal(0, desvio, n).round().astype(int)
+    sal = start_min + 480 + rng.normal(0, desvio, n).round().astype(int)
+    f_ent = pd.DatetimeIndex(fecha[idx]) + pd.to_timedelta(ent // (24 * 60), unit="D")
+    f_sal = pd.DatetimeIndex(fecha[idx]) + pd.to_timedelta(sal // (24 * 60), unit="D")
+    h_ent = _hhmmss(ent).astype(object)
+    h_sal = _hhmmss(sal).astype(object)
+    h_ent[rng.random(n) < punch_noise / 4] = None
+    h_sal[rng.random(n) < punch_noise / 4] = None
+    retraso = np.clip(ent - start_min, 0, None) / 60
+    anticipada = np.clip(start_min + 480 - sal, 0, None) / 60
+
+    asistencias = pd.DataFrame({
+        "RUT": ruts[w_idx[idx]],
+        "Fecha Entrada": f_ent,
+        "Hora Entrada": h_ent,
+        "Fecha Salida": f_sal,
+        "Hora Salida": h_sal,
+        "Día": pd.DatetimeIndex(fecha[idx]).strftime("%d-%m-%Y"),
+        **meta(w_idx[idx]),
+        "Turno": sig[idx],
+        **tail(w_idx[idx]),
+        "Retraso (horas)": retraso.round(2),
+        "Salida Anticipada (horas)": anticipada.round(2),
+    }).sort_values(["Fecha Entrada", "RUT"], kind="stable").reset_index(drop=True)
+
+    return {
+        "turnos": SHIFTS.copy(),
+        "activos": activos,
+        "inasistencias": inasistencias,
+        "asistencias": asistencias,
+    }
+
+def write_workbooks(data: dict, out_dir) -> dict:
+    """
+    Escribe los 3 archivos .xlsx como los sube el usuario; devuelve sus rutas.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "turnos": os.path.join(out_dir, "codificacion_turnos_buk.xlsx"),
+        "reporte": os.path.join(out_dir, "reporte_turnos.xlsx"),
+        "detalle": os.path.join(out_dir, "detalle_turnos_colaboradores.xlsx"),
+    }
+    data["turnos"].to_excel(paths["turnos"], index=False)
+    data["activos"].to_excel(paths["reporte"], index=False)
+    with pd.ExcelWriter(paths["detalle"]) as w:
+        data["inasistencias"].to_excel(w, index=False, sheet_name="Inasistencias")
+        data["asistencias"].to_excel(w, index=False, sheet_name="Asistencias")
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera planillas sintéticas de turnos / marcajes.")
+    parser.add_argument("--workers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--start", default="2025-03-01")
+    parser.add_argument("--punch-noise", type=float, default=0.1)
+    parser.add_argument("--overnight-share", type=float, default=0.2)
+    parser.add_argument("--absence-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="datos_sinteticos")
+    args = parser.parse_args(argv)
+
+    data = generate(args.workers, args.days, args.start, args.punch_noise,
+                    args.overnight_share, args.absence_rate, seed=args.seed)
+    for k, path in write_workbooks(data, args.out).items():
+        print(f"{k}: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import clasificaciones
+
+def incidencias():
+    # filas 0 y 1 son gemelas: mismo RUT, fecha, tipo y detalle
+    return pd.DataFrame({
+        "Fecha": ["03-03-2025", "03-03-2025", "04-03-2025"],
+        "RUT": ["10.712.710-0", "10.712.710-0", "10.712.710-0"],
+        "Tipo_Incidencia": ["Marcaje/Turno", "Marcaje/Turno", "Inasistencia"],
+        "Detalle": ["Retraso 0.25h", "Retraso 0.25h", "Falta"],
+        "Clasificación Manual": ["Seleccionar"] * 3,
+    })
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "clasif.sqlite")
+
+def test_gemelas_se_guardan_por_separado(db):
+    df = incidencias()
+    df.loc[1, "Clasificación Manual"] = "Permiso"
+    assert clasificaciones.guardar(df, [1], db_path=db) == 1
+
+    out = clasificaciones.aplicar(incidencias(), db_path=db)
+    assert out["Clasificación Manual"].tolist() == ["Seleccionar", "Permiso", "Seleccionar"]
+
+def test_migra_base_sin_ocurrencia(db):
+    con = sqlite3.connect(db)
+    con.executescript("""
+        CREATE TABLE clasificaciones (
+            rut_norm TEXT NOT NULL, fecha TEXT NOT NULL, tipo TEXT NOT NULL, detalle_hash TEXT NOT NULL,
+            clasificacion TEXT NOT NULL, actualizado TEXT NOT NULL,
+            PRIMARY KEY (rut_norm, fecha, tipo, detalle_hash)
+        ) WITHOUT ROWID;
+        CREATE INDEX clasificaciones_fecha ON clasificaciones (fecha);
+    """)
+    k = clasificaciones.claves(incidencias()).iloc[2]
+    con.execute("INSERT INTO clasificaciones VALUES (?, ?, ?, ?, ?, ?)",
+                (k["RUT_norm"], k["Fecha"], k["Tipo_Incidencia"], k["Detalle_hash"], "Injustificada", "x"))
+    con.commit()
+    con.close()
+
+    out = clasificaciones.aplicar(incidencias(), db_path=db)
+    assert out["Clasificación Manual"].tolist() == ["Seleccionar", "Seleccionar", "Injustificada"]
+
+def test_base_privada(tmp_path):
+    db = tmp_path / "nueva" / "clasif.sqlite"
+    clasificaciones.aplicar(incidencias(), db_path=str(db))
+    assert db.parent.stat().st_mode & 0o777 == 0o700
+    assert db.stat().st_mode & 0o777 == 0o600
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="requiere cambiar el dueño del archivo")
+def test_base_de_otro_usuario(db):
+    open(db, "w").close()
+    os.chown(db, 12345, 12345)
+    with pytest.raises(PermissionError):
+        clasificaciones.aplicar(incidencias(), db_path=db)
+
+def test_fusionar_gemelas_una_a_una():
+    importadas = incidencias()
+    importadas["Clasificación Manual"] = ["Injustificada", "Permiso", "Seleccionar"]
+    df, filas, conflictos, sin_cruce, invalidas = clasificaciones.fusionar(incidencias(), importadas)
+    assert df["Clasificación Manual"].tolist() == ["Injustificada", "Permiso", "Seleccionar"]
+    assert list(filas) == [0, 1]
+    assert len(conflictos) == 0 and len(sin_cruce) == 0 and len(invalidas) == 0
+
+def test_fusionar_informa_invalidas_y_conflictos():
+    tabla = incidencias()
+    tabla.loc[2, "Clasificación Manual"] = "Permiso"
+    importadas = incidencias()
+    importadas["Clasificación Manual"] = ["Seleccionar", "Otra cosa", "Injustificada"]
+    df, filas, conflictos, _, invalidas = clasificaciones.fusionar(tabla, importadas)
+    assert invalidas["Clasificación Manual"].tolist() == ["Otra cosa"]
+    assert conflictos["Clasificación importada"].tolist() == ["Injustificada"]
+    assert df["Clasificación Manual"].tolist() == ["Seleccionar", "Seleccionar", "Injustificada"]
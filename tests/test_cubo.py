@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from cubo import CuboIncidencias
+
+def incidencias(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "RUT": rng.choice(["10.712.710-0", "11.111.111-1", "12.345.678-5"], n),
+        "Fecha": rng.choice(["03-03-2025", "04-03-2025", "05-03-2025"], n),
+        "Supervisor": rng.choice(["Ana", "Luis"], n),
+        "Especialidad": rng.choice(["Conductor", "Anfitrión"], n),
+        "Tipo_Incidencia": rng.choice(["Inasistencia", "Marcaje/Turno"], n),
+        "Clasificación Manual": "Seleccionar",
+    })
+
+AREAS = pd.Series(["T1", "T2"], index=[10712710, 11111111])
+
+def test_deltas_igual_que_rearmar():
+    tabla = incidencias()
+    cubo = CuboIncidencias(tabla, AREAS)
+    rng = np.random.default_rng(1)
+    for _ in range(30):
+        filas = rng.choice(tabla.index, 5, replace=False)
+        antes = tabla.loc[filas].copy()
+        tabla.loc[filas, "Clasificación Manual"] = rng.choice(["Seleccionar", "Injustificada", "Permiso"], 5)
+        cubo.aplicar(antes, tabla.loc[filas])
+
+    fresco = CuboIncidencias(tabla, AREAS)
+    for por in (["Área"], ["Supervisor", "Tipo_Incidencia"], ["Día"]):
+        a = cubo.consultar(por=por).sort_values(por).reset_index(drop=True)
+        b = fresco.consultar(por=por).sort_values(por).reset_index(drop=True)
+        pd.testing.assert_frame_equal(a[sorted(a.columns)], b[sorted(b.columns)], check_dtype=False)
+    assert cubo.opciones("Clasificación Manual") == fresco.opciones("Clasificación Manual")
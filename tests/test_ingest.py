@@ -0,0 +1,56 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+import excel_cache
+from ingest import load_detalle
+from pipeline import normalizar
+
+@pytest.fixture(autouse=True)
+def cache_tmp(tmp_path, monkeypatch):
+    # setenv: los procesos del pool (spawn) vuelven a importar excel_cache y leen la variable
+    cache = str(tmp_path / "cache")
+    monkeypatch.setenv("INCIDENCIAS_CACHE_DIR", cache)
+    monkeypatch.setattr(excel_cache, "CACHE_DIR", cache)
+
+def detalle_xlsx() -> bytes:
+    inasist = pd.DataFrame({"RUT": ["11.111.111-1"], "Día": ["03-03-2025"], "Motivo": ["Falta"]})
+    # dos marcajes del mismo RUT y día que solo difieren en la hora
+    asist = pd.DataFrame({
+        "RUT": ["10.712.710-0", "10.712.710-0"],
+        "Fecha Entrada": ["03-03-2025", "03-03-2025"],
+        "Hora Entrada": ["13:51:00", "13:59:00"],
+        "Hora Salida": ["15:00:00", "15:03:00"],
+        "Retraso (horas)": [0.0, 0.0],
+        "Salida Anticipada (horas)": [0.0, 0.0],
+    })
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        inasist.to_excel(writer, sheet_name="Inasistencias", index=False)
+        asist.to_excel(writer, sheet_name="Asistencias", index=False)
+    return buf.getvalue()
+
+def test_marcajes_mismo_dia_no_se_juntan():
+    df_inasist, df_asist, _ = load_detalle([("detalle.xlsx", detalle_xlsx())])
+    assert len(df_asist) == 2
+    assert sorted(df_asist["Hora Entrada"].astype(str)) == ["13:51:00", "13:59:00"]
+
+    activos = pd.DataFrame({"Nombre del Colaborador": ["X"], "RUT": ["10.712.710-0"], "03-03-2025": ["M"]})
+    _, _, _, df_asist_n = normalizar(activos, df_inasist, df_asist, "RUT", "RUT")
+    assert len(df_asist_n) == 2
+
+def test_archivo_repetido_entra_una_vez():
+    data = detalle_xlsx()
+    df_inasist, df_asist, _ = load_detalle([("a.xlsx", data), ("b.xlsx", data)])
+    assert len(df_inasist) == 1
+    assert len(df_asist) == 2
+
+@pytest.mark.parametrize("csv", [
+    "RUT;Fecha Entrada;Retraso (horas);Salida Anticipada (horas)\n10.712.710-0;03-03-2025;0,25;1,5\n",
+    'RUT,Fecha Entrada,Retraso (horas),Salida Anticipada (horas)\n10.712.710-0,03-03-2025,"0,25","1,5"\n',
+])
+def test_csv_coma_decimal(csv):
+    _, df_asist, _ = load_detalle([("asist.csv", csv.encode("utf-8"))])
+    assert df_asist["Retraso (horas)"].tolist() == [0.25]
+    assert df_asist["Salida Anticipada (horas)"].tolist() == [1.5]
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from pipeline import maybe_filter_area, run_pipeline
+from synthetic_data import generate
+
+AREAS = {"AEROPUERTO SCL": "T1", "AEROPUERTO PMC": "T1 (SCL)"}
+
+@pytest.fixture(scope="module")
+def datos():
+    d = generate(workers=60, days=7, seed=1)
+    for k in ("activos", "inasistencias", "asistencias"):
+        d[k]["Área"] = d[k]["Área"].replace(AREAS)
+    return d
+
+def ruts_area(d, area):
+    return set(d["activos"].loc[d["activos"]["Área"] == area, "RUT"])
+
+def test_filtro_area_es_literal(datos):
+    # "(" no se interpreta como regex; el texto contenido sigue siendo el filtro de la app
+    assert set(maybe_filter_area(datos["activos"], "t1 (scl)")["Área"]) == {"T1 (SCL)"}
+    assert set(maybe_filter_area(datos["activos"], "T1")["Área"]) == {"T1", "T1 (SCL)"}
+
+@pytest.mark.parametrize("area", ["T1", "T1 (SCL)"])
+def test_area_exacta_no_mezcla_areas(datos, area):
+    sheets = run_pipeline(datos["activos"], datos["inasistencias"], datos["asistencias"],
+                          only_area=area, area_exacta=True)
+    ruts = set(sheets["Incidencias"]["RUT"])
+    assert ruts
+    assert ruts <= ruts_area(datos, area)
+
+def test_fecha_repetida_en_grilla(datos):
+    # mismo día con dos encabezados (texto y fecha): kpi_matrix no debe fallar al reindexar
+    activos = datos["activos"].copy()
+    activos[pd.Timestamp("2025-03-02")] = activos["02-03-2025"]
+    sheets = run_pipeline(activos, datos["inasistencias"], datos["asistencias"])
+    assert not sheets["KPIs_Diarios"].empty
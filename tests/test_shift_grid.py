@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from shift_grid import ShiftGrid
+
+def test_fechas_repetidas_se_juntan():
+    # la misma fecha con dos encabezados (dos Reporte Turnos concatenados)
+    df = pd.DataFrame({
+        "03-03-2025": ["M", np.nan, np.nan],
+        "04-03-2025": ["T", "T", np.nan],
+        "2025-03-03": [np.nan, "N", np.nan],
+    })
+    fechas = pd.to_datetime(["2025-03-03", "2025-03-04", "2025-03-03"])
+    g = ShiftGrid.from_wide(df, list(df.columns), fechas)
+
+    assert list(g.fechas) == list(pd.to_datetime(["2025-03-03", "2025-03-04"]))
+    assert g.shape == (3, 2)
+    celdas = np.append(g.valores, None)[g.codes]
+    assert celdas[:, 0].tolist() == ["M", "N", None]
+    assert celdas[:, 1].tolist() == ["T", "T", None]
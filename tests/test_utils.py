@@ -0,0 +1,30 @@
+import pandas as pd
+
+from utils import match_punches
+
+def turnos():
+    return pd.DataFrame({
+        "RUT": ["10712710-0"],
+        "EntradaEsperada": [pd.Timestamp("2025-03-03 08:00")],
+        "SalidaEsperada": [pd.Timestamp("2025-03-03 16:00")],
+    })
+
+def test_match_punches_sin_asistencias():
+    asist = pd.DataFrame({
+        "RUT": pd.Series([], dtype=object),
+        "EntradaRealDT": pd.Series([], dtype="datetime64[ns]"),
+        "SalidaRealDT": pd.Series([], dtype="datetime64[ns]"),
+    })
+    out = match_punches(turnos(), asist)
+    assert len(out) == 1
+    assert out["EntradaRealDT"].isna().all() and out["SalidaRealDT"].isna().all()
+
+def test_match_punches_asigna_al_turno():
+    asist = pd.DataFrame({
+        "RUT": ["10712710-0"],
+        "EntradaRealDT": [pd.Timestamp("2025-03-03 08:10")],
+        "SalidaRealDT": [pd.Timestamp("2025-03-03 15:50")],
+    })
+    out = match_punches(turnos(), asist)
+    assert out.loc[0, "EntradaRealDT"] == pd.Timestamp("2025-03-03 08:10")
+    assert out.loc[0, "SalidaRealDT"] == pd.Timestamp("2025-03-03 15:50")
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from perf import timed
+from shift_grid import ShiftGrid
 
 def read_excel(uploaded_file) -> pd.DataFrame:
     return pd.read_excel(uploaded_file)
@@ -19,6 +23,36 @@ def _parse_time(s: str):
             pass
     return None
 
+_TIME_RE = r"^(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?$"
+
+def parse_time_td(values: pd.Series) -> pd.Series:
+    """
+    Hora del día como timedelta64 desde medianoche (NaT si no se reconoce).
+    Acepta "7:55:00", "07:55", datetime.time o una columna que ya viene en timedelta.
+    Se parsea una vez por valor distinto.
+    """
+    if pd.api.types.is_timedelta64_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    u = pd.Series(np.asarray(uniques, dtype=object), dtype=object).astype(str).str.strip()
+    parts = u.str.extract(_TIME_RE).astype(float)
+    h, m, sec = parts[0], parts[1], parts[2].fillna(0)
+    secs = (h * 3600 + m * 60 + sec).where((h < 24) & (m < 60) & (sec < 60))
+    # el último elemento cubre los nulos (código -1 de factorize)
+    td = pd.to_timedelta(np.append(secs.to_numpy(dtype=float), np.nan), unit="s")
+    return pd.Series(td[codes], index=values.index)
+
+def combine_date_time(fechas: pd.Series, horas: pd.Series) -> pd.Series:
+    """
+    Día de `fechas` + hora del día de `horas`, como datetime64 (NaT si falta alguno).
+    """
+    return pd.to_datetime(fechas, errors="coerce").dt.normalize() + parse_time_td(horas)
+
+def _time_to_seconds(t):
+    if t is None:
+        return np.nan
+    return t.hour * 3600 + t.minute * 60 + t.second
+
 def _parse_shift_range(shift_str: str):
     """
     Devuelve (start_time, end_time, crosses_midnight)
@@ -47,6 +81,7 @@ def _parse_shift_range(shift_str: str):
     crosses = (datetime.combine(datetime.today(), t2) <= datetime.combine(datetime.today(), t1))
     return (t1, t2, crosses)
 
+@timed("utils.build_shift_catalog")
 def build_shift_catalog(df_cod: pd.DataFrame) -> pd.DataFrame:
     # Espera columnas: Sigla, Horario, Tipo, Jornada
     df = df_cod.copy()
@@ -72,11 +107,36 @@ def build_shift_catalog(df_cod: pd.DataFrame) -> pd.DataFrame:
 
     # key normalizada
     df["Sigla_norm"] = df["Sigla"].astype(str).str.strip().str.upper()
+
+    # lookup compilado (Sigla_norm -> rango), viaja con el catálogo
+    df.attrs["lookup"] = compile_shift_lookup(df)
     return df
 
-def normalize_shift_to_range(value, shift_catalog: pd.DataFrame):
+def compile_shift_lookup(shift_catalog: pd.DataFrame) -> dict:
+    """
+    Diccionario Sigla_norm -> (HoraInicio, HoraFin, CruzaMedianoche, Sigla).
+    Las siglas repetidas en el catálogo quedan fuera (se tratan como rango horario).
+    """
+    cat = shift_catalog[~shift_catalog["Sigla_norm"].duplicated(keep=False)]
+    return {
+        key: (t1, t2, bool(cr), str(sigla))
+        for key, t1, t2, cr, sigla in zip(
+            cat["Sigla_norm"], cat["HoraInicio"], cat["HoraFin"], cat["CruzaMedianoche"], cat["Sigla"]
+        )
+    }
+
+def _shift_lookup(shift_catalog) -> dict:
+    if isinstance(shift_catalog, dict):
+        return shift_catalog
+    lookup = shift_catalog.attrs.get("lookup")
+    if lookup is None:
+        lookup = compile_shift_lookup(shift_catalog)
+    return lookup
+
+def normalize_shift_to_range(value, shift_catalog):
     """
     value puede ser Sigla o Horario.
+    shift_catalog: catálogo de build_shift_catalog o su lookup compilado.
     """
     if pd.isna(value):
         return (None, None, False, None)
@@ -86,11 +146,9 @@ def normalize_shift_to_range(value, shift_catalog: pd.DataFrame):
         return (None, None, False, None)
 
     # ¿Es sigla?
-    key = s.upper()
-    hit = shift_catalog[shift_catalog["Sigla_norm"] == key]
-    if len(hit) == 1:
-        row = hit.iloc[0]
-        return (row["HoraInicio"], row["HoraFin"], bool(row["CruzaMedianoche"]), str(row["Sigla"]))
+    hit = _shift_lookup(shift_catalog).get(s.upper())
+    if hit is not None:
+        return hit
 
     # si no, intenta parsear como rango horario
     t1, t2, cr = _parse_shift_range(s)
@@ -99,11 +157,34 @@ def normalize_shift_to_range(value, shift_catalog: pd.DataFrame):
 
     return (None, None, False, None)
 
+def normalize_shift_series(values: pd.Series, shift_catalog, columns) -> pd.DataFrame:
+    """
+    normalize_shift_to_range una vez por valor distinto y se reparte a todas las filas.
+    columns: nombres para (inicio, fin, cruza_medianoche, sigla).
+    Inicio y fin quedan como timedelta64 desde medianoche.
+    """
+    lookup = _shift_lookup(shift_catalog)
+    codes, uniques = pd.factorize(values)
+    # el último elemento cubre los nulos (código -1 de factorize)
+    res = [normalize_shift_to_range(u, lookup) for u in uniques] + [(None, None, False, None)]
+    starts, ends, crosses, siglas = zip(*res)
+    starts = pd.to_timedelta(np.array([_time_to_seconds(t) for t in starts], dtype=float), unit="s")
+    ends = pd.to_timedelta(np.array([_time_to_seconds(t) for t in ends], dtype=float), unit="s")
+    return pd.DataFrame({
+        columns[0]: starts[codes],
+        columns[1]: ends[codes],
+        columns[2]: np.array(crosses, dtype=bool)[codes],
+        columns[3]: np.array(siglas, dtype=object)[codes],
+    }, index=values.index)
+
+@timed("utils.prepare_activos_turnos")
 def prepare_activos_turnos(df_act: pd.DataFrame, shift_catalog: pd.DataFrame) -> pd.DataFrame:
     """
-    Convierte base ancha a larga:
+    Turnos esperados desde la base ancha (sin melt, ver ShiftGrid), una fila por turno válido:
     RUT + metadata + Fecha + TurnoOriginal + HoraInicioExp + HoraFinExp + CruzaMedianoche
-    Aplica regla: solo desde la primera fecha con turno no vacío por trabajador.
+    (HoraInicioExp / HoraFinExp como timedelta64 desde medianoche) + PrimeraFechaActiva.
+    Aplica regla: solo desde la primera fecha con turno no vacío por trabajador; solo se
+    arman las filas (RUT, día) con turno válido, que son las que cruza detect_incidencias.
     """
     df = df_act.copy()
     df.columns = [str(c).strip() for c in df.columns]
@@ -117,32 +198,35 @@ def prepare_activos_turnos(df_act: pd.DataFrame, shift_catalog: pd.DataFrame) ->
     if not date_cols:
         raise ValueError("No encontré columnas fecha DD-MM-AAAA en 'Activos + Turnos'.")
 
-    long = df.melt(id_vars=meta, value_vars=date_cols, var_name="Fecha", value_name="TurnoOriginal")
-    long["Fecha"] = pd.to_datetime(long["Fecha"], format="%d-%m-%Y", errors="coerce")
+    fechas = pd.to_datetime(pd.Index(date_cols), format="%d-%m-%Y", errors="coerce")
+    grid = ShiftGrid.from_wide(df, date_cols, fechas)
 
-    # normaliza turnos
-    out = long.apply(
-        lambda r: normalize_shift_to_range(r["TurnoOriginal"], shift_catalog),
-        axis=1,
-        result_type="expand",
-    )
-    out.columns = ["HoraInicioExp", "HoraFinExp", "CruzaMedianoche", "SiglaDetectada"]
-    long = pd.concat([long, out], axis=1)
+    # normaliza turnos: una vez por valor distinto de la grilla
+    cols = ["HoraInicioExp", "HoraFinExp", "CruzaMedianoche", "SiglaDetectada"]
+    por_valor = normalize_shift_series(pd.Series(grid.valores, dtype=object), shift_catalog, cols)
+    validos = grid.mask(por_valor["HoraInicioExp"].notna().to_numpy())
 
     # primer día válido por trabajador (turno con HoraInicioExp no nula)
-    rut_col = "RUT" if "RUT" in long.columns else meta[0]
-    first_valid = (
-        long[long["HoraInicioExp"].notna()]
-        .groupby(rut_col)["Fecha"]
-        .min()
-        .rename("PrimeraFechaActiva")
-        .reset_index()
-    )
-    long = long.merge(first_valid, on=rut_col, how="left")
-    long = long[long["Fecha"] >= long["PrimeraFechaActiva"]].copy()
+    rut_col = "RUT" if "RUT" in df.columns else meta[0]
+    first_pos = grid.first_active(validos)
+    first_fila = pd.Series(grid.fechas[first_pos].where(first_pos >= 0), index=grid.filas)
+    first_valid = first_fila.groupby(df.loc[grid.filas, rut_col].to_numpy()).transform("min")
+
+    # filas largas solo para los turnos válidos (todos quedan >= PrimeraFechaActiva);
+    # sin RUT no hay primera fecha y la fila se descarta
+    validos &= first_valid.notna().to_numpy()[:, None]
+    rows, dias = grid.long(validos)
+    codes = grid.codes[rows, dias]
+    long = df[meta].iloc[rows].reset_index(drop=True)
+    long["Fecha"] = grid.fechas[dias]
+    long["TurnoOriginal"] = grid.valores[codes]
+    for c in cols:
+        long[c] = por_valor[c].to_numpy()[codes]
+    long["PrimeraFechaActiva"] = first_valid.to_numpy()[rows]
 
     return long
 
+@timed("utils.prepare_asistencias")
 def prepare_asistencias(df_asi: pd.DataFrame, shift_catalog: pd.DataFrame) -> pd.DataFrame:
     df = df_asi.copy()
     df.columns = [str(c).strip() for c in df.columns]
@@ -152,25 +236,64 @@ def prepare_asistencias(df_asi: pd.DataFrame, shift_catalog: pd.DataFrame) -> pd
         if col in df.columns:
             df[col] = pd.to_datetime(df[col], errors="coerce")
 
-    # parse horas
+    # parse horas (timedelta64 desde medianoche)
     for col in ["Hora Entrada", "Hora Salida"]:
         if col in df.columns:
-            df[col] = df[col].apply(_parse_time)
+            df[col] = parse_time_td(df[col])
+
+    # datetime reales de marcaje (los reutilizan detect_incidencias y build_outputs)
+    for fecha_col, hora_col, dt_col in [("Fecha Entrada", "Hora Entrada", "EntradaRealDT"),
+                                        ("Fecha Salida", "Hora Salida", "SalidaRealDT")]:
+        if fecha_col in df.columns and hora_col in df.columns:
+            df[dt_col] = combine_date_time(df[fecha_col], df[hora_col])
 
     # normaliza turno declarado (opcional)
     if "Turno" in df.columns:
-        out = df.apply(
-            lambda r: normalize_shift_to_range(r["Turno"], shift_catalog),
-            axis=1,
-            result_type="expand",
+        out = normalize_shift_series(
+            df["Turno"], shift_catalog,
+            ["HoraInicioTurno", "HoraFinTurno", "CruzaMedianocheTurno", "SiglaDetectadaTurno"],
         )
-        out.columns = ["HoraInicioTurno", "HoraFinTurno", "CruzaMedianocheTurno", "SiglaDetectadaTurno"]
         df = pd.concat([df, out], axis=1)
 
     return df
 
+def match_punches(shifts: pd.DataFrame, asist: pd.DataFrame, window_h: float = 12) -> pd.DataFrame:
+    """
+    Asigna cada marcaje al turno planificado más cercano del mismo RUT (merge_asof por RUT):
+    - entradas (EntradaRealDT) contra EntradaEsperada
+    - salidas (SalidaRealDT) contra SalidaEsperada (así los turnos noche cierran al día siguiente)
+    Solo se consideran marcajes a menos de window_h horas del turno.
+    Devuelve `shifts` (mismas filas, mismo orden) + EntradaRealDT (la más temprana asignada)
+    y SalidaRealDT (la más tardía asignada).
+    """
+    out = shifts.copy()
+    # RUT con un solo dtype en ambos lados: vacío (object) vs texto (str en pandas 3) no cruza
+    turnos = pd.DataFrame({
+        "RUT": shifts["RUT"].to_numpy(),
+        "_turno": np.arange(len(shifts)),
+    }).astype({"RUT": str})
+    tol = pd.Timedelta(hours=window_h)
+
+    for real_col, esp_col, agg in [("EntradaRealDT", "EntradaEsperada", "min"),
+                                   ("SalidaRealDT", "SalidaEsperada", "max")]:
+        t = turnos.assign(_t=pd.to_datetime(shifts[esp_col]).astype("datetime64[ns]").to_numpy())
+        t = t[t["_t"].notna()].sort_values("_t")
+        m = pd.DataFrame({
+            "RUT": asist["RUT"].to_numpy(),
+            real_col: pd.to_datetime(asist[real_col]).astype("datetime64[ns]").to_numpy(),
+        }).astype({"RUT": str})
+        m = m[m[real_col].notna()].sort_values(real_col)
+        m = pd.merge_asof(m, t, left_on=real_col, right_on="_t", by="RUT",
+                          direction="nearest", tolerance=tol)
+        m = m[m["_turno"].notna()]
+        per_turno = m.groupby(m["_turno"].astype("int64"))[real_col].agg(agg)
+        out[real_col] = per_turno.reindex(np.arange(len(shifts))).to_numpy()
+
+    return out
+
+@timed("utils.detect_incidencias")
 def detect_incidencias(act_long: pd.DataFrame, asist: pd.DataFrame, df_det: pd.DataFrame,
-                      tolerance_min: int = 5, manual_df=None) -> pd.DataFrame:
+                      tolerance_min: int = 5, manual_df=None, match_window_h: float = 12) -> pd.DataFrame:
     """
     Regla base:
     - Para cada (RUT, Fecha) con turno esperado válido:
@@ -180,6 +303,8 @@ def detect_incidencias(act_long: pd.DataFrame, asist: pd.DataFrame, df_det: pd.D
         - Sin marcaje salida
         - Entrada tardía (minutos > tolerancia)
         - Salida anticipada (minutos > tolerancia)
+    Los marcajes se asignan al turno más cercano del mismo RUT (ver match_punches),
+    así varios marcajes en un día no duplican filas y los turnos noche cruzan bien la medianoche.
     Nota: aquí dejamos la lógica simple y robusta; luego afinamos con tus datos reales.
     """
     df = act_long.copy()
@@ -190,13 +315,12 @@ def detect_incidencias(act_long: pd.DataFrame, asist: pd.DataFrame, df_det: pd.D
 
     df = df[df["HoraInicioExp"].notna()].copy()
 
-    # arma datetime esperado
-    df["EntradaEsperada"] = df.apply(lambda r: datetime.combine(r["Fecha"].date(), r["HoraInicioExp"]), axis=1)
-    df["SalidaEsperada"] = df.apply(
-        lambda r: datetime.combine((r["Fecha"] + timedelta(days=1)).date(), r["HoraFinExp"])
-        if r["CruzaMedianoche"]
-        else datetime.combine(r["Fecha"].date(), r["HoraFinExp"]),
-        axis=1,
+    # arma datetime esperado: Fecha + hora inicio/fin (+1 día si cruza medianoche)
+    dia = df["Fecha"].dt.normalize()
+    df["EntradaEsperada"] = dia + parse_time_td(df["HoraInicioExp"])
+    df["SalidaEsperada"] = (
+        dia + parse_time_td(df["HoraFinExp"])
+        + pd.to_timedelta(df["CruzaMedianoche"].astype(bool).astype("int64"), unit="D")
     )
 
     # prepara asistencias con datetime reales (si vienen separadas)
@@ -206,60 +330,36 @@ def detect_incidencias(act_long: pd.DataFrame, asist: pd.DataFrame, df_det: pd.D
     def _combine(fecha_col, hora_col):
         if fecha_col not in a.columns or hora_col not in a.columns:
             return pd.NaT
-        dt = []
-        for f, t in zip(a[fecha_col], a[hora_col]):
-            if pd.isna(f) or t is None:
-                dt.append(pd.NaT)
-            else:
-                dt.append(datetime.combine(pd.to_datetime(f).date(), t))
-        return pd.to_datetime(dt, errors="coerce")
-
-    a["EntradaRealDT"] = _combine("Fecha Entrada", "Hora Entrada")
-    a["SalidaRealDT"] = _combine("Fecha Salida", "Hora Salida")
-
-    # join aproximado: por RUT y por fecha de entrada esperada (día)
-    # (más adelante afinamos si hay múltiples marcajes por día)
-    a["FechaBase"] = pd.to_datetime(a["Fecha Entrada"], errors="coerce").dt.date
-    df["FechaBase"] = df["Fecha"].dt.date
-
-    merged = df.merge(
-        a[["RUT", "FechaBase", "EntradaRealDT", "SalidaRealDT"]],
-        on=["RUT", "FechaBase"],
-        how="left",
+        return combine_date_time(a[fecha_col], a[hora_col])
+
+    if "EntradaRealDT" not in a.columns:
+        a["EntradaRealDT"] = _combine("Fecha Entrada", "Hora Entrada")
+    if "SalidaRealDT" not in a.columns:
+        a["SalidaRealDT"] = _combine("Fecha Salida", "Hora Salida")
+
+    # asigna marcajes al turno más cercano (una fila por turno esperado)
+    merged = match_punches(df, a, window_h=match_window_h)
+
+    tol = pd.Timedelta(minutes=tolerance_min)
+
+    # detecta incidencias: una máscara por tipo sobre las columnas completas
+    sin_entrada = merged["EntradaRealDT"].isna()
+    sin_salida = merged["SalidaRealDT"].isna()
+    tipos = [
+        ("Sin marcaje entrada", sin_entrada),
+        ("Entrada tardía", ~sin_entrada & (merged["EntradaRealDT"] > merged["EntradaEsperada"] + tol)),
+        ("Sin marcaje salida", sin_salida),
+        ("Salida anticipada", ~sin_salida & (merged["SalidaRealDT"] < merged["SalidaEsperada"] - tol)),
+    ]
+
+    cols = ["RUT", "Fecha", "TurnoOriginal", "EntradaEsperada", "SalidaEsperada", "EntradaRealDT", "SalidaRealDT"]
+    base = merged[cols].reset_index(drop=True)
+    inc = pd.concat(
+        [base[m.to_numpy()].assign(**{"Tipo Incidencia": t}) for t, m in tipos]
     )
-
-    tol = timedelta(minutes=tolerance_min)
-
-    # detecta incidencias
-    incidencias = []
-    for _, r in merged.iterrows():
-        tipos = []
-        if pd.isna(r["EntradaRealDT"]):
-            tipos.append("Sin marcaje entrada")
-        else:
-            if r["EntradaRealDT"] > (r["EntradaEsperada"] + tol):
-                tipos.append("Entrada tardía")
-
-        if pd.isna(r["SalidaRealDT"]):
-            tipos.append("Sin marcaje salida")
-        else:
-            if r["SalidaRealDT"] < (r["SalidaEsperada"] - tol):
-                tipos.append("Salida anticipada")
-
-        for t in tipos:
-            incidencias.append({
-                "RUT": r["RUT"],
-                "Fecha": r["Fecha"],
-                "TurnoOriginal": r["TurnoOriginal"],
-                "EntradaEsperada": r["EntradaEsperada"],
-                "SalidaEsperada": r["SalidaEsperada"],
-                "EntradaRealDT": r["EntradaRealDT"],
-                "SalidaRealDT": r["SalidaRealDT"],
-                "Tipo Incidencia": t,
-                "Comprobación Incidencia": "Indefinido",
-            })
-
-    inc = pd.DataFrame(incidencias)
+    # orden de fila de merged (y entrada antes que salida), como el recorrido original
+    inc = inc.sort_index(kind="stable").reset_index(drop=True)
+    inc["Comprobación Incidencia"] = "Indefinido"
 
     # agrega manual si viene
     if manual_df is not None and len(manual_df) > 0:
@@ -272,6 +372,7 @@ def detect_incidencias(act_long: pd.DataFrame, asist: pd.DataFrame, df_det: pd.D
 
     return inc
 
+@timed("utils.build_outputs")
 def build_outputs(act_long: pd.DataFrame, asist: pd.DataFrame, incidencias_edit: pd.DataFrame) -> dict:
     out = {}
 
@@ -290,48 +391,68 @@ def build_outputs(act_long: pd.DataFrame, asist: pd.DataFrame, incidencias_edit:
     })
     out["reporte_marcaje"] = rep_m
 
-    # base de turnos esperados
-    base = act_long[act_long["HoraInicioExp"].notna()].copy()
-    base["FechaBase"] = base["Fecha"].dt.date
+    # hechos por (RUT, día): un solo join de los turnos esperados contra los conteos del día
+    # (incidencias "Procede" y marcajes, agregados juntos); un marcaje repetido en el día
+    # pesa como una fila más del join (Filas_join), igual que un merge fila a fila
+    base = act_long.loc[act_long["HoraInicioExp"].notna(), ["RUT", "Fecha"]]
+    base = pd.DataFrame({"RUT": base["RUT"].to_numpy(), "FechaBase": base["Fecha"].dt.normalize().to_numpy()})
+
+    proc_dia = pd.DataFrame({
+        "RUT": proc["RUT"].to_numpy(),
+        "FechaBase": pd.to_datetime(proc["Fecha"]).dt.normalize().to_numpy(),
+        "Inc_Procede_Q": 1, "Marcajes": 0, "Con_Entrada": 0,
+    })
+    asist_dia = pd.DataFrame({
+        "RUT": asist["RUT"].to_numpy(),
+        "FechaBase": pd.to_datetime(asist["Fecha Entrada"], errors="coerce").dt.normalize().to_numpy(),
+        "Inc_Procede_Q": 0, "Marcajes": 1, "Con_Entrada": asist["EntradaRealDT"].notna().to_numpy(dtype="int64"),
+    })
+    por_dia = (
+        pd.concat([proc_dia, asist_dia], ignore_index=True)
+        .groupby(["RUT", "FechaBase"], dropna=False, sort=False).sum()
+        .reset_index()
+    )
+    fact = base.merge(por_dia, on=["RUT", "FechaBase"], how="left")
+    fact[["Inc_Procede_Q", "Marcajes", "Con_Entrada"]] = fact[["Inc_Procede_Q", "Marcajes", "Con_Entrada"]].fillna(0).astype("int64")
+
+    # columnas precalculadas: todas las agregaciones son sumas
+    fecha_ok = fact["FechaBase"].notna().to_numpy()
+    filas_join = np.maximum(fact["Marcajes"].to_numpy(), 1)
+    fact["Turno"] = fecha_ok.astype("int64")
+    fact["Sin_Procede"] = (fact["Inc_Procede_Q"] == 0).astype("int64")
+    fact["Con_Procede"] = (fact["Inc_Procede_Q"] > 0).astype("int64")
+    fact["Filas_join"] = filas_join * fecha_ok
+    fact["Filas_join_rut"] = filas_join * fact["RUT"].notna().to_numpy()
+    fact["Sin_Entrada"] = filas_join - fact["Con_Entrada"]
 
-    # marca si tiene incidencia "Procede" en ese día
-    proc_day = proc.copy()
-    proc_day["FechaBase"] = pd.to_datetime(proc_day["Fecha"]).dt.date
-    proc_flag = proc_day.groupby(["RUT", "FechaBase"]).size().reset_index(name="Inc_Procede_Q")
-    base = base.merge(proc_flag, on=["RUT", "FechaBase"], how="left")
-    base["Inc_Procede_Q"] = base["Inc_Procede_Q"].fillna(0)
+    por_rut = fact.groupby("RUT")[["Turno", "Sin_Procede", "Con_Procede", "Filas_join", "Sin_Entrada"]].sum()
 
     # 4) cumplimiento por trabajador (simple): días sin incidencias procede / total turnos
-    cum = base.groupby("RUT").agg(
-        Turnos=("FechaBase", "count"),
-        Turnos_sin_incidencias_procede=("Inc_Procede_Q", lambda s: (s == 0).sum()),
-        Turnos_con_incidencias_procede=("Inc_Procede_Q", lambda s: (s > 0).sum()),
+    cum = por_rut[["Turno", "Sin_Procede", "Con_Procede"]].set_axis(
+        ["Turnos", "Turnos_sin_incidencias_procede", "Turnos_con_incidencias_procede"], axis=1
     ).reset_index()
     cum["Pct_Cumplimiento"] = (cum["Turnos_sin_incidencias_procede"] / cum["Turnos"]).round(4)
     out["cumplimiento_trabajador"] = cum.sort_values("Pct_Cumplimiento")
 
     # 5) ausentismo (proxy): sin entrada real + turno esperado
     # (afinamos después con tus reglas finales)
-    a = asist.copy()
-    a["FechaBase"] = pd.to_datetime(a["Fecha Entrada"], errors="coerce").dt.date
-    joined = base.merge(a[["RUT", "FechaBase", "EntradaRealDT"]], on=["RUT", "FechaBase"], how="left")
-    aus = joined.groupby("RUT").agg(
-        Turnos=("FechaBase", "count"),
-        Sin_Entrada=("EntradaRealDT", lambda s: s.isna().sum()),
-    ).reset_index()
+    aus = por_rut[["Filas_join", "Sin_Entrada"]].set_axis(["Turnos", "Sin_Entrada"], axis=1).reset_index()
     aus["Pct_Ausentismo"] = (aus["Sin_Entrada"] / aus["Turnos"]).round(4)
     out["ausentismo_trabajador"] = aus.sort_values("Pct_Ausentismo", ascending=False)
 
     # 6) asistencia diaria: % con entrada real
-    daily = joined.groupby("FechaBase").agg(
-        Turnos=("RUT", "count"),
-        Con_Entrada=("EntradaRealDT", lambda s: s.notna().sum())
-    ).reset_index()
+    daily = (
+        fact.groupby("FechaBase")[["Filas_join_rut", "Con_Entrada"]].sum()
+        .set_axis(["Turnos", "Con_Entrada"], axis=1)
+        .reset_index()
+    )
+    daily["FechaBase"] = daily["FechaBase"].dt.date
     daily["Pct_Asistencia"] = (daily["Con_Entrada"] / daily["Turnos"]).round(4)
     out["asistencia_diaria"] = daily.sort_values("FechaBase")
 
     return out
 
+@timed("utils.to_excel_bytes")
 def to_excel_bytes(obj, sheet_name="Sheet1", multi_sheet=False, filename_hint="out.xlsx") -> bytes:
     import io
     buffer = io.BytesIO()